@@ -0,0 +1,146 @@
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing import get_context
+from telemetry import Telemetry
+from typing import Dict, List
+
+# Fixed-seed workloads for every EC program, to catch performance regressions between commits:
+#   python benchmark.py                               # run everything, save benchmark_results/<commit>.json
+#   python benchmark.py --compare benchmark_results/<other commit>.json
+# Every workload runs in a fresh process so peak memory and module state don't leak from one into the next
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmark_results")
+SEED = 42
+
+# Program -> (directory, module, population sizes, generations)
+WORKLOADS = {
+    'simple_game_ai': ('simple_game_ai', 'simple_game_ai_ec', [50, 200], 10),
+    'path_planning': ('path_planning', 'path_planning_ec', [100, 400], 20),
+    'symbolic_regression': ('symbolic_regression', 'symbolic_regression_ec', [100, 500], 10),
+    # On the stand-in simulator, in process, so it measures the EA and not SUMO
+    'traffic_light': ('traffic_light', 'traffic_light_ec', [50, 100], 10),
+}
+
+# Nearest-rank percentile
+def percentile(values: List[float], fraction: 'float') -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+# Runs the traffic light evolution on the stand-in simulator, writing its network files to a throwaway directory
+def run_traffic_light(module, population_size: 'int', num_generations: 'int', seed: 'int'):
+    from simulator_backend import StandInBackend
+    module.population_size = population_size
+    module.num_generations = num_generations
+    random.seed(seed)
+    with tempfile.TemporaryDirectory() as network_dir:
+        module.evolutionary_algorithm(backend=StandInBackend(), num_workers=1, network_dir=network_dir)
+
+# Runs one workload (inside its own process) and measures it through the program's telemetry
+def run_workload(program: 'str', population_size: 'int', num_generations: 'int', seed: 'int') -> Dict:
+    directory, module_name, _, _ = WORKLOADS[program]
+    # The programs expect to run from the repository root with their own directory importable
+    os.chdir(REPO_ROOT)
+    sys.path.insert(0, os.path.join(REPO_ROOT, directory))
+    module = importlib.import_module(module_name)
+    module.telemetry = Telemetry(program=program, keep_records=True)
+    start = time.perf_counter()
+    # The programs report progress on stdout, keep it out of the benchmark's
+    with contextlib.redirect_stdout(io.StringIO()):
+        if program == 'traffic_light':
+            run_traffic_light(module, population_size, num_generations, seed)
+        else:
+            module.main(population_size=population_size, num_generations=num_generations, seed=seed)
+    elapsed = time.perf_counter() - start
+    records = module.telemetry.records
+    # The traffic light counts simulations, the others evaluations
+    evaluations = sum(record['counters'].get('evaluations', 0) + record['counters'].get('simulations', 0) for record in records)
+    latencies = [record['duration'] for record in records if record['generation'] > 0]
+    return {
+        'program': program,
+        'population_size': population_size,
+        'generations': num_generations,
+        'seed': seed,
+        'seconds': elapsed,
+        'evaluations': evaluations,
+        'evaluations_per_second': evaluations / elapsed,
+        'generation_latency': {
+            'p50': percentile(latencies, 0.5),
+            'p90': percentile(latencies, 0.9),
+            'p99': percentile(latencies, 0.99),
+            'max': max(latencies),
+        },
+        # ru_maxrss is in KiB on Linux
+        'peak_memory_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'best_fitness': records[-1].get('best'),
+    }
+
+# Short hash of the checked out commit, marked dirty when the tree has uncommitted changes
+def current_commit() -> str:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if dirty else commit
+
+def run_benchmarks(programs: List[str], sizes: List[int] = None, num_generations: 'int' = None, seed: 'int' = SEED) -> List[Dict]:
+    # Pin the hash seed, iteration order over sets of strings must not change between runs
+    os.environ.setdefault("PYTHONHASHSEED", "0")
+    context = get_context("spawn")
+    results = []
+    for program in programs:
+        _, _, default_sizes, default_generations = WORKLOADS[program]
+        for population_size in sizes or default_sizes:
+            with context.Pool(processes=1) as pool:
+                result = pool.apply(run_workload, (program, population_size, num_generations or default_generations, seed))
+            print(f"{program:20} pop {population_size:5}: {result['evaluations_per_second']:10.1f} evals/s, "
+                  f"generation p50 {result['generation_latency']['p50'] * 1000:8.1f} ms p90 {result['generation_latency']['p90'] * 1000:8.1f} ms, "
+                  f"peak {result['peak_memory_mb']:7.1f} MB")
+            results.append(result)
+    return results
+
+# Prints how every workload of the current results does against a saved run
+def compare(results: List[Dict], baseline_path: 'str'):
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+    baseline_results = {(result['program'], result['population_size'], result['generations']): result for result in baseline['results']}
+    print(f"Compared to {baseline['commit']}:")
+    for result in results:
+        other = baseline_results.get((result['program'], result['population_size'], result['generations']))
+        if other is None:
+            continue
+        print(f"{result['program']:20} pop {result['population_size']:5}: "
+              f"evals/s x{result['evaluations_per_second'] / other['evaluations_per_second']:.2f}, "
+              f"p50 latency x{result['generation_latency']['p50'] / other['generation_latency']['p50']:.2f}, "
+              f"peak memory x{result['peak_memory_mb'] / other['peak_memory_mb']:.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the EC programs on fixed-seed workloads")
+    parser.add_argument("--programs", nargs="+", choices=list(WORKLOADS), default=list(WORKLOADS), help="programs to benchmark")
+    parser.add_argument("--sizes", nargs="+", type=int, help="population sizes, instead of each program's defaults")
+    parser.add_argument("--generations", type=int, help="generations per workload, instead of each program's default")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--output", help="where to save the results (default benchmark_results/<commit>.json)")
+    parser.add_argument("--compare", help="saved results to compare against")
+    args = parser.parse_args()
+    results = run_benchmarks(args.programs, sizes=args.sizes, num_generations=args.generations, seed=args.seed)
+    commit = current_commit()
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump({'commit': commit, 'time': time.time(), 'python': platform.python_version(), 'machine': platform.node(), 'results': results}, file, indent=2, default=float)
+    print(f"Saved results to {output}")
+    if args.compare:
+        compare(results, args.compare)
@@ -1,7 +1,12 @@
 import numpy as np
-import matplotlib.pyplot as plt 
 from deap import base, creator, algorithms, tools
 import random
+import os
+import sys
+
+# Shared helpers (telemetry.py) live in the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from telemetry import Telemetry
 
 # Environment Setup
 MAZE_SIZE = (20, 20)
@@ -45,44 +50,69 @@ toolbox.register("mutate", tools.mutShuffleIndexes, indpb=0.1)
 
 # Visualization 
 def plot_maze_and_path(path):
+    # matplotlib is only needed to look at the result, keep it out of headless runs
+    import matplotlib.pyplot as plt
     plt.imshow(maze, cmap='gray')
     plt.plot(*zip(*path), color='red')
     plt.scatter(*START, color='green', s=80)
     plt.scatter(*GOAL, color='blue', s=80)
     plt.show()
 
+# Per generation timings and counters, written as JSON Lines when TELEMETRY_FILE is set (PROFILE_GENERATION runs one under cProfile)
+telemetry = Telemetry.from_environment(program="path_planning")
+
 # Basic Evolutionary Loop
 NUM_GENERATIONS = 50 
 POPULATION_SIZE = 100
 
-pop = toolbox.population(n=POPULATION_SIZE)
+# Runs the evolution and returns the final population, nothing happens at import so the problem can be benchmarked
+def main(population_size=POPULATION_SIZE, num_generations=NUM_GENERATIONS, seed=None):
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+    pop = toolbox.population(n=population_size)
+    evolve(pop, num_generations)
+    return pop
 
-for gen in range(NUM_GENERATIONS):
-    offspring = tools.selTournament(pop, len(pop), tournsize=3)
-    offspring = [toolbox.clone(ind) for ind in offspring]
+# Evolves the population in place for num_generations generations
+def evolve(pop, num_generations):
+    for gen in range(num_generations):
+        telemetry.start_generation(gen + 1)
+        with telemetry.timer("selection"):
+            offspring = tools.selTournament(pop, len(pop), tournsize=3)
+        with telemetry.timer("clone"):
+            offspring = [toolbox.clone(ind) for ind in offspring]
 
-    # Apply crossover and mutation
-    for ind1, ind2 in zip(offspring[::2], offspring[1::2]):
-        if random.random() < 0.7:  # Sample crossover probability
-            toolbox.mate(ind1, ind2)
-            del ind1.fitness.values
-            del ind2.fitness.values
+        # Apply crossover and mutation
+        with telemetry.timer("variation"):
+            for ind1, ind2 in zip(offspring[::2], offspring[1::2]):
+                if random.random() < 0.7:  # Sample crossover probability
+                    toolbox.mate(ind1, ind2)
+                    del ind1.fitness.values
+                    del ind2.fitness.values
 
-    for mutant in offspring:
-        if random.random() < 0.2:  # Sample mutation probability
-            toolbox.mutate(mutant)
-            del mutant.fitness.values
+            for mutant in offspring:
+                if random.random() < 0.2:  # Sample mutation probability
+                    toolbox.mutate(mutant)
+                    del mutant.fitness.values
 
-    # Evaluate fitness of the new individuals
-    invalid_ind = [ind for ind in offspring if not ind.fitness.valid]
-    fitnesses = toolbox.map(toolbox.evaluate, invalid_ind)
-    for ind, fit in zip(invalid_ind, fitnesses):
-        ind.fitness.values = fit
+        # Evaluate fitness of the new individuals
+        invalid_ind = [ind for ind in offspring if not ind.fitness.valid]
+        with telemetry.timer("evaluation"):
+            fitnesses = toolbox.map(toolbox.evaluate, invalid_ind)
+            for ind, fit in zip(invalid_ind, fitnesses):
+                ind.fitness.values = fit
+        telemetry.count("evaluations", len(invalid_ind))
 
-    pop[:] = offspring
+        pop[:] = offspring
+        fitness_values = [ind.fitness.values[0] for ind in pop]
+        telemetry.end_generation(gen + 1, best=min(fitness_values), mean=float(np.mean(fitness_values)))
+    telemetry.close()
 
-best_individual = tools.selBest(pop, 1)[0]
-plot_maze_and_path(best_individual)
-print("Fitness:", best_individual.fitness.values[0])
+if __name__ == "__main__":
+    pop = main()
+    best_individual = tools.selBest(pop, 1)[0]
+    plot_maze_and_path(best_individual)
+    print("Fitness:", best_individual.fitness.values[0])
 
 # *** Placeholder for HITL Integration *** 
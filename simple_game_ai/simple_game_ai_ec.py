@@ -1,6 +1,12 @@
 import random
 import copy
 from deap import base, creator, algorithms, tools 
+import os
+import sys
+
+# Shared helpers (telemetry.py) live in the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from telemetry import Telemetry
 
 class TicTacToe:
     def __init__(self):
@@ -34,7 +40,7 @@ def random_ai(board):
     return random.choice(moves)
 
 def decision_tree_ai(board):
-    if board.available_moves()[4] == 4:  # If center is open, take it
+    if 4 in board.available_moves():  # If center is open, take it
         return 4
     elif len(board.available_moves()) == 8:  # First move, take a corner
         return random.choice([0, 2, 6, 8])
@@ -76,47 +82,69 @@ def init_individual(n=5):
     return [random.choice(PRIORITIES) for _ in range(n)]
 
 toolbox = base.Toolbox()
-toolbox.register("individual", init_individual) 
+toolbox.register("individual", tools.initIterate, creator.Individual, init_individual)
 toolbox.register("population", tools.initRepeat, list, toolbox.individual)
 toolbox.register("evaluate", evaluate_ai)
 toolbox.register("select", tools.selTournament, tournsize=3)
 toolbox.register("mate", tools.cxTwoPoint)
 toolbox.register("mutate", tools.mutFlipBit, indpb=0.05)
 
+# Per generation timings and counters, written as JSON Lines when TELEMETRY_FILE is set (PROFILE_GENERATION runs one under cProfile)
+telemetry = Telemetry.from_environment(program="simple_game_ai")
+
 # Basic Evolutionary Loop
 NUM_GENERATIONS = 20 
 POPULATION_SIZE = 50
 
-pop = toolbox.population(n=POPULATION_SIZE)
-
-for gen in range(NUM_GENERATIONS):
-    offspring = tools.selTournament(pop, len(pop), tournsize=3)
-    offspring = [toolbox.clone(ind) for ind in offspring]
-
-    # Apply crossover and mutation
-    for ind1, ind2 in zip(offspring[::2], offspring[1::2]):
-        if random.random() < 0.7:  # Sample crossover probability
-            toolbox.mate(ind1, ind2)
-            del ind1.fitness.values
-            del ind2.fitness.values
-
-    for mutant in offspring:
-        if random.random() < 0.2:  # Sample mutation probability
-            toolbox.mutate(mutant)
-            del mutant.fitness.values
-
-    # Evaluate fitness of the new individuals
-    invalid_ind = [ind for ind in offspring if not ind.fitness.valid]
-    fitnesses = toolbox.map(toolbox.evaluate, invalid_ind)
-    for ind, fit in zip(invalid_ind, fitnesses):
-        ind.fitness.values = fit
-
-    pop[:] = offspring
-
-# Placeholder for Examining Results 
-best_individual = tools.selBest(pop, 1)[0]
-print("Best Individual:", best_individual)
-print("Fitness:", best_individual.fitness.values[0])
+# Runs the evolution and returns the final population, nothing happens at import so the problem can be benchmarked
+def main(population_size=POPULATION_SIZE, num_generations=NUM_GENERATIONS, seed=None):
+    if seed is not None:
+        random.seed(seed)
+    pop = toolbox.population(n=population_size)
+    evolve(pop, num_generations)
+    return pop
+
+# Evolves the population in place for num_generations generations
+def evolve(pop, num_generations):
+    for gen in range(num_generations):
+        telemetry.start_generation(gen + 1)
+        with telemetry.timer("selection"):
+            offspring = tools.selTournament(pop, len(pop), tournsize=3)
+        with telemetry.timer("clone"):
+            offspring = [toolbox.clone(ind) for ind in offspring]
+
+        # Apply crossover and mutation
+        with telemetry.timer("variation"):
+            for ind1, ind2 in zip(offspring[::2], offspring[1::2]):
+                if random.random() < 0.7:  # Sample crossover probability
+                    toolbox.mate(ind1, ind2)
+                    del ind1.fitness.values
+                    del ind2.fitness.values
+
+            for mutant in offspring:
+                if random.random() < 0.2:  # Sample mutation probability
+                    toolbox.mutate(mutant)
+                    del mutant.fitness.values
+
+        # Evaluate fitness of the new individuals
+        invalid_ind = [ind for ind in offspring if not ind.fitness.valid]
+        with telemetry.timer("evaluation"):
+            fitnesses = toolbox.map(toolbox.evaluate, invalid_ind)
+            for ind, fit in zip(invalid_ind, fitnesses):
+                ind.fitness.values = fit
+        telemetry.count("evaluations", len(invalid_ind))
+
+        pop[:] = offspring
+        fitness_values = [ind.fitness.values[0] for ind in pop]
+        telemetry.end_generation(gen + 1, best=max(fitness_values), mean=sum(fitness_values) / len(fitness_values))
+    telemetry.close()
+
+if __name__ == "__main__":
+    pop = main()
+    # Placeholder for Examining Results 
+    best_individual = tools.selBest(pop, 1)[0]
+    print("Best Individual:", best_individual)
+    print("Fitness:", best_individual.fitness.values[0])
 
 # *** Placeholder for HITL Integration ***
 # You'll add code to:
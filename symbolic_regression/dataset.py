@@ -0,0 +1,74 @@
+import json
+import os
+import uuid
+import numpy as np
+from typing import Dict, Iterator, List
+
+# File (inside a dataset directory) naming the input columns and the target, every column is <name>.npy next to it
+META_FILE_NAME = "dataset.json"
+
+# Training data as named columns: the inputs (one per variable of the primitive set) and the target
+# Saved datasets are opened as read-only memory maps, nothing is read until it is used and the pages are shared by
+# every process that opens the same files. Such a dataset pickles as its directory, so sending it to a worker
+# process copies no data no matter how many rows it has
+class Dataset:
+    def __init__(self, inputs: Dict[str, np.ndarray], target: np.ndarray, path: 'str' = None, key: 'str' = None):
+        # Variable name -> column, in the order of the primitive set's arguments
+        self.inputs = inputs
+        self.target = target
+        # Directory the dataset was loaded from, None for an in-memory dataset
+        self.path = path
+        # Identifies the data, e.g. for caches that only hold for one dataset; survives pickling
+        self.key = key if key is not None else path if path is not None else uuid.uuid4().hex
+
+    @property
+    def variables(self) -> List[str]:
+        return list(self.inputs)
+
+    def __len__(self) -> int:
+        return len(self.target)
+
+    # Writes the columns as .npy files (which load() maps back) and returns the saved dataset
+    def save(self, directory: 'str', target_name: 'str' = 'y') -> 'Dataset':
+        os.makedirs(directory, exist_ok=True)
+        for name, column in list(self.inputs.items()) + [(target_name, self.target)]:
+            np.save(os.path.join(directory, f"{name}.npy"), np.asarray(column, dtype=np.float64))
+        with open(os.path.join(directory, META_FILE_NAME), 'w') as file:
+            json.dump({'inputs': self.variables, 'target': target_name}, file)
+        return Dataset.load(directory)
+
+    @classmethod
+    def load(cls, directory: 'str') -> 'Dataset':
+        with open(os.path.join(directory, META_FILE_NAME)) as file:
+            meta = json.load(file)
+        def column(name):
+            return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+        return cls({name: column(name) for name in meta['inputs']}, column(meta['target']), path=directory)
+
+    # A saved dataset is reopened (mapped) from its directory on unpickling instead of being copied, an in-memory one
+    # is copied whole
+    def __reduce__(self):
+        if self.path is not None:
+            return (Dataset.load, (self.path,))
+        return (Dataset, (self.inputs, self.target, None, self.key))
+
+    # Input columns for the given rows (a slice), as views
+    def input_rows(self, rows: 'slice' = None) -> Dict[str, np.ndarray]:
+        rows = rows if rows is not None else slice(None)
+        return {name: column[rows] for name, column in self.inputs.items()}
+
+    def target_rows(self, rows: 'slice' = None) -> np.ndarray:
+        return self.target[rows if rows is not None else slice(None)]
+
+    # Rows of the index-th mini-batch: every stride-th row from a rotating offset, so consecutive batches cover
+    # the whole dataset evenly (sorted data included) and each is a strided view, not a copy
+    def batch_rows(self, index: 'int', batch_size: 'int') -> 'slice':
+        stride = max(1, len(self) // max(1, batch_size))
+        return slice(index % stride, None, stride)
+
+    # Consecutive slices of at most chunk_size of the rows, so a pass over the data never holds more than a chunk
+    def chunks(self, chunk_size: 'int', rows: 'slice' = None) -> Iterator['slice']:
+        start, stop, step = (rows if rows is not None else slice(None)).indices(len(self))
+        span = chunk_size * step
+        for chunk_start in range(start, stop, span):
+            yield slice(chunk_start, min(chunk_start + span, stop), step)
@@ -2,6 +2,16 @@ import numpy as np
 import random
 from deap import base, creator, gp, tools 
 import operator
+from collections import OrderedDict
+from functools import partial
+from multiprocessing import Pool
+import os
+import sys
+
+# Shared helpers (telemetry.py) live in the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from telemetry import Telemetry
+from dataset import Dataset
 
 # Defining Functions (Our Building Blocks)
 def protected_div(left, right):
@@ -10,13 +20,35 @@ def protected_div(left, right):
     except ZeroDivisionError:
         return 1
 
-pset = gp.PrimitiveSet("MAIN", 1)  # 'MAIN' is the name of the function 
-pset.addPrimitive(operator.add, 2)
-pset.addPrimitive(operator.sub, 2)
-pset.addPrimitive(operator.mul, 2)
-pset.addPrimitive(protected_div, 2)
-pset.addEphemeralConstant("rand101", lambda: random.randint(-1,1)) 
-pset.renameArguments(ARG0='x')  
+# Element-wise protected_div over arrays: 1 wherever the divisor is 0
+def vectorized_protected_div(left, right):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(right == 0, 1.0, np.divide(left, right))
+
+# NumPy versions of the primitives by name, for evaluating a tree over a whole array at once
+VECTORIZED_PRIMITIVES = {
+    'add': np.add,
+    'sub': np.subtract,
+    'mul': np.multiply,
+    'protected_div': vectorized_protected_div,
+}
+
+# Ephemeral constants, a named function (not a lambda) so trees can be pickled to worker processes
+def random_constant():
+    return random.randint(-1, 1)
+
+# Primitive set over the given input variables, one argument each
+def create_primitive_set(variables):
+    pset = gp.PrimitiveSet("MAIN", len(variables))  # 'MAIN' is the name of the function 
+    pset.addPrimitive(operator.add, 2)
+    pset.addPrimitive(operator.sub, 2)
+    pset.addPrimitive(operator.mul, 2)
+    pset.addPrimitive(protected_div, 2)
+    pset.addEphemeralConstant("rand101", random_constant)
+    pset.renameArguments(**{f"ARG{index}": variable for index, variable in enumerate(variables)})
+    return pset
+
+pset = create_primitive_set(['x'])
 
 # Fitness Function and Individual/Population Setup
 creator.create("FitnessMin", base.Fitness, weights=(-1.0,))  # Minimize error
@@ -28,55 +60,317 @@ toolbox.register("individual", tools.initIterate, creator.Individual, toolbox.ex
 toolbox.register("population", tools.initRepeat, list, toolbox.individual)
 toolbox.register("compile", gp.compile, pset=pset)
 
-def evaluate(individual, points):
-    func = toolbox.compile(expr=individual)
-    mse = np.mean((func(*x) - y)**2 for x, y in points)  
-    return mse,
+# Runs a tree over all the data in one pass of ufuncs: the prefix expression is walked from the back with a stack,
+# terminals push their array (arguments) or value (constants), primitives pop their arguments and push their result
+def evaluate_tree(individual, arguments):
+    stack = []
+    with np.errstate(over='ignore', invalid='ignore'):
+        for node in reversed(individual):
+            if isinstance(node, gp.Terminal):
+                stack.append(arguments[node.value] if node.value in arguments else node.value)
+            else:
+                # The first argument is on top
+                args = [stack.pop() for _ in range(node.arity)]
+                stack.append(VECTORIZED_PRIMITIVES[node.name](*args))
+    return stack.pop()
+
+# Outputs of subtrees on the training data, by the subtree's canonical string (what str() of the subtree gives).
+# Offspring share most of their subtrees with their parents, with the cache only their new parts are computed
+# Least recently used outputs are evicted once the arrays take more than max_bytes. Tied to one dataset
+class SubtreeCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        # Key of the dataset the outputs were computed on
+        self.dataset_key = None
+        self._outputs = OrderedDict()
+
+    # Ties the cache to a dataset, dropping everything computed on another one
+    def bind(self, dataset_key):
+        if dataset_key != self.dataset_key:
+            self._outputs.clear()
+            self.nbytes = 0
+            self.dataset_key = dataset_key
+
+    def get(self, key):
+        output = self._outputs.get(key)
+        if output is None:
+            self.misses += 1
+            return None
+        self._outputs.move_to_end(key)
+        self.hits += 1
+        return output
+
+    def put(self, key, output):
+        if key in self._outputs or output.nbytes > self.max_bytes:
+            return
+        # Cached arrays are handed out to every tree containing the subtree, nobody may change them
+        output.setflags(write=False)
+        self._outputs[key] = output
+        self.nbytes += output.nbytes
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._outputs.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+# evaluate_tree through a SubtreeCache: one pass from the back builds every subtree's canonical string and finds
+# its children, then the tree is evaluated from the root down, stopping at every subtree whose output is cached
+def evaluate_tree_cached(individual, arguments, cache):
+    keys = [None] * len(individual)
+    children = [None] * len(individual)
+    # (key, position) of the subtrees to the right of the current node, the first argument on top
+    stack = []
+    for position in range(len(individual) - 1, -1, -1):
+        node = individual[position]
+        if isinstance(node, gp.Terminal):
+            keys[position] = node.format()
+        else:
+            args = [stack.pop() for _ in range(node.arity)]
+            keys[position] = node.format(*(key for key, _ in args))
+            children[position] = [child for _, child in args]
+        stack.append((keys[position], position))
+
+    def evaluate_subtree(position):
+        node = individual[position]
+        if isinstance(node, gp.Terminal):
+            return arguments[node.value] if node.value in arguments else node.value
+        output = cache.get(keys[position])
+        if output is None:
+            output = VECTORIZED_PRIMITIVES[node.name](*(evaluate_subtree(child) for child in children[position]))
+            # Subtrees of constants come out as plain numbers, only arrays are worth keeping
+            if isinstance(output, np.ndarray):
+                cache.put(keys[position], output)
+        return output
+
+    with np.errstate(over='ignore', invalid='ignore'):
+        return evaluate_subtree(0)
+
+# Simplified (subtree, key, constant value or None) from a primitive and its simplified arguments, None when no
+# rule applies: constant arguments are folded, identities (add 0, sub 0, mul 1, protected_div by 1) and annihilators
+# (mul 0) drop the dead branch, sub(a, a) is 0, and protected_div(a, a) and protected_div(a, 0) are 1 (as evaluated)
+def simplify_primitive(node, args):
+    def constant(value):
+        terminal = gp.Terminal(value, False, node.ret)
+        return [terminal], terminal.format(), value
+    if all(value is not None for _, _, value in args):
+        return constant(pset.context[node.name](*(value for _, _, value in args)))
+    if node.arity != 2:
+        return None
+    (_, left_key, left_value), (_, right_key, right_value) = args
+    if node.name == 'add':
+        if left_value == 0:
+            return args[1]
+        if right_value == 0:
+            return args[0]
+    elif node.name == 'sub':
+        if right_value == 0:
+            return args[0]
+        if left_key == right_key:
+            return constant(0)
+    elif node.name == 'mul':
+        if left_value == 0 or right_value == 0:
+            return constant(0)
+        if left_value == 1:
+            return args[1]
+        if right_value == 1:
+            return args[0]
+    elif node.name == 'protected_div':
+        if right_value == 0 or left_key == right_key:
+            return constant(1)
+        if right_value == 1:
+            return args[0]
+    return None
+
+# Smaller equivalent of a tree to evaluate in its place, the individual itself (its genome) is left alone
+# Built bottom-up in one pass from the back, like evaluate_tree, with every subtree's nodes, key and constant value
+# Differs from the original only where that would overflow, e.g. mul(0, a) is 0 even where a is inf
+def simplify(individual):
+    stack = []
+    for node in reversed(individual):
+        if isinstance(node, gp.Terminal):
+            # Arguments and named terminals are symbols, anything else is a constant
+            stack.append(([node], node.format(), None if isinstance(node.value, str) else node.value))
+            continue
+        args = [stack.pop() for _ in range(node.arity)]
+        simplified = simplify_primitive(node, args)
+        if simplified is None:
+            simplified = ([node] + [child for nodes, _, _ in args for child in nodes], node.format(*(key for _, key, _ in args)), None)
+        stack.append(simplified)
+    return gp.PrimitiveTree(stack.pop()[0])
+
+# Evaluate the simplified form of every tree (see simplify)
+SIMPLIFY = True
+
+# Rows scored at a time, a pass over a dataset never holds more than this many rows of any intermediate result
+EVALUATION_CHUNK_ROWS = 1000000
+
+# Mean squared error of the tree on the dataset's rows (a slice, all of them by default), chunk by chunk
+# The subtree cache only holds outputs on all the rows, so it is only used when they fit in a single chunk
+def evaluate(individual, dataset, rows=None, cache=None):
+    use_cache = cache is not None and rows is None and len(dataset) <= EVALUATION_CHUNK_ROWS
+    # Dead code never reaches the evaluation or the cache
+    if SIMPLIFY:
+        individual = simplify(individual)
+    if use_cache:
+        cache.bind(dataset.key)
+    squared_error = 0.0
+    count = 0
+    # A tree without inputs comes out as a single number, broadcasting takes care of it
+    with np.errstate(over='ignore', invalid='ignore'):
+        for chunk in dataset.chunks(EVALUATION_CHUNK_ROWS, rows):
+            arguments = dataset.input_rows(chunk)
+            target = dataset.target_rows(chunk)
+            output = None
+            if use_cache:
+                try:
+                    output = evaluate_tree_cached(individual, arguments, cache)
+                except RecursionError:
+                    # Deeper than the recursion limit, evaluate_tree has no recursion to run out of
+                    pass
+            if output is None:
+                output = evaluate_tree(individual, arguments)
+            squared_error += float(np.sum((output - target)**2))
+            count += len(target)
+    mse = squared_error / max(count, 1)
+    # Overflowing trees score worst instead of poisoning the comparisons with NaN
+    return (mse if np.isfinite(mse) else np.inf),
 
 # Generating Data
-x_data = np.linspace(-1, 1, 50)
-y_data = x_data**2 + np.random.rand(len(x_data)) * 0.2  # True function with noise
-data_points = list(zip(x_data, y_data))
+def generate_data(num_points=50):
+    x_data = np.linspace(-1, 1, num_points)
+    y_data = x_data**2 + np.random.rand(len(x_data)) * 0.2  # True function with noise
+    return Dataset({'x': x_data}, y_data)
 
 # Basic Evolutionary Setup
-pop = toolbox.population(n=500)
-toolbox.register("evaluate", evaluate, points=data_points)
 toolbox.register("select", tools.selTournament, tournsize=3)
 toolbox.register("mate", gp.cxOnePoint)
 toolbox.register("expr_mut", gp.genFull, min_=0, max_=2)
 toolbox.register("mutate", gp.mutUniform, expr=toolbox.expr_mut, pset=pset)
 
+# Switches the primitive set (and everything built on it) to the given input variables, e.g. a dataset's
+def use_variables(variables):
+    global pset
+    if list(variables) == pset.arguments:
+        return
+    pset = create_primitive_set(variables)
+    toolbox.register("expr", gp.genHalfAndHalf, pset=pset, min_=1, max_=2)
+    toolbox.register("individual", tools.initIterate, creator.Individual, toolbox.expr)
+    toolbox.register("population", tools.initRepeat, list, toolbox.individual)
+    toolbox.register("compile", gp.compile, pset=pset)
+    toolbox.register("expr_mut", gp.genFull, min_=0, max_=2)
+    toolbox.register("mutate", gp.mutUniform, expr=toolbox.expr_mut, pset=pset)
+
+# Per generation timings and counters, written as JSON Lines when TELEMETRY_FILE is set (PROFILE_GENERATION runs one under cProfile)
+telemetry = Telemetry.from_environment(program="symbolic_regression")
+
+# Reuse the outputs of subtrees seen before (see SubtreeCache), up to SUBTREE_CACHE_BYTES of them
+SUBTREE_CACHE = True
+SUBTREE_CACHE_BYTES = 256 * 1024 * 1024
+
+# Directory of a saved Dataset (see dataset.py) to fit instead of the generated points, its columns are memory mapped
+DATASET_DIR = None
+# Worker processes evaluating the individuals, 1 evaluates in process. Saved datasets reach the workers as their
+# directory and are mapped there, so the workers share the pages instead of holding copies. In-memory datasets
+# (e.g. the generated points) are pickled in full with every batch of individuals, save large ones first
+NUM_WORKERS = 1
+
+# Mini-batch fitness: score everyone on a rotating MINI_BATCH_SIZE row subsample (see Dataset.batch_rows) every
+# generation, and only the NUM_RESCORED_ELITES best of each generation on all the data, into a hall of fame
+MINI_BATCH = False
+MINI_BATCH_SIZE = 10000
+NUM_RESCORED_ELITES = 5
+
 # Basic Evolutionary Loop
 NUM_GENERATIONS = 20  # Adjust as needed
+POPULATION_SIZE = 500
 
-for gen in range(NUM_GENERATIONS):
-    offspring = tools.selTournament(pop, len(pop), tournsize=3)
-    offspring = [toolbox.clone(ind) for ind in offspring]
-
-    # Apply crossover and mutation
-    for ind1, ind2 in zip(offspring[::2], offspring[1::2]):
-        if random.random() < 0.7:  # Sample crossover probability
-            toolbox.mate(ind1, ind2)
-            del ind1.fitness.values
-            del ind2.fitness.values
-
-    for mutant in offspring:
-        if random.random() < 0.2:  # Sample mutation probability
-            toolbox.mutate(mutant)
-            del mutant.fitness.values
-
-    # Evaluate fitness of the new individuals
-    invalid_ind = [ind for ind in offspring if not ind.fitness.valid]
-    fitnesses = toolbox.map(toolbox.evaluate, invalid_ind)
-    for ind, fit in zip(invalid_ind, fitnesses):
-        ind.fitness.values = fit
+# Runs the evolution and returns the final population, nothing happens at import so the problem can be benchmarked
+def main(population_size=POPULATION_SIZE, num_generations=NUM_GENERATIONS, seed=None, dataset=None, num_workers=NUM_WORKERS):
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+    if dataset is None:
+        dataset = Dataset.load(DATASET_DIR) if DATASET_DIR is not None else generate_data()
+    use_variables(dataset.variables)
+    # The cache lives in this process, workers would each get an empty copy with every batch of individuals
+    cache = SubtreeCache(max_bytes=SUBTREE_CACHE_BYTES) if SUBTREE_CACHE and num_workers == 1 else None
+    toolbox.register("evaluate", evaluate, dataset=dataset, cache=cache)
+    pool = Pool(processes=num_workers) if num_workers > 1 else None
+    toolbox.register("map", pool.map if pool is not None else map)
+    try:
+        pop = toolbox.population(n=population_size)
+        evolve(pop, num_generations, dataset=dataset)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return pop
+
+# Evolves the population in place for num_generations generations
+# With MINI_BATCH the final population is re-scored on all the data and its worst give way to the hall of fame
+def evolve(pop, num_generations, dataset=None):
+    hall_of_fame = tools.HallOfFame(NUM_RESCORED_ELITES) if MINI_BATCH else None
+    for gen in range(num_generations):
+        telemetry.start_generation(gen + 1)
+        with telemetry.timer("selection"):
+            offspring = tools.selTournament(pop, len(pop), tournsize=3)
+        with telemetry.timer("clone"):
+            offspring = [toolbox.clone(ind) for ind in offspring]
+
+        # Apply crossover and mutation
+        with telemetry.timer("variation"):
+            for ind1, ind2 in zip(offspring[::2], offspring[1::2]):
+                if random.random() < 0.7:  # Sample crossover probability
+                    toolbox.mate(ind1, ind2)
+                    del ind1.fitness.values
+                    del ind2.fitness.values
+
+            for mutant in offspring:
+                if random.random() < 0.2:  # Sample mutation probability
+                    toolbox.mutate(mutant)
+                    del mutant.fitness.values
 
-    pop[:] = offspring
+        # Evaluate fitness of the new individuals, on a mini-batch everyone: scores on different batches don't compare
+        rows = dataset.batch_rows(gen, MINI_BATCH_SIZE) if hall_of_fame is not None else None
+        invalid_ind = offspring if rows is not None else [ind for ind in offspring if not ind.fitness.valid]
+        with telemetry.timer("evaluation"):
+            fitnesses = toolbox.map(partial(toolbox.evaluate, rows=rows), invalid_ind)
+            for ind, fit in zip(invalid_ind, fitnesses):
+                ind.fitness.values = fit
+        telemetry.count("evaluations", len(invalid_ind))
+
+        pop[:] = offspring
+        fitness_values = [ind.fitness.values[0] for ind in pop]
+        if hall_of_fame is not None:
+            with telemetry.timer("rescoring"):
+                rescore(tools.selBest(pop, NUM_RESCORED_ELITES), hall_of_fame)
+            telemetry.end_generation(gen + 1, best=hall_of_fame[0].fitness.values[0], batch_best=min(fitness_values), mean=float(np.mean(fitness_values)))
+        else:
+            telemetry.end_generation(gen + 1, best=min(fitness_values), mean=float(np.mean(fitness_values)))
+    if hall_of_fame is not None:
+        # Leave a population scored on all the data, with the best individuals seen kept in it
+        pop[:] = rescore(pop, hall_of_fame)
+        worst = sorted(range(len(pop)), key=lambda index: pop[index].fitness.values[0], reverse=True)
+        for index, ind in zip(worst, hall_of_fame):
+            pop[index] = toolbox.clone(ind)
+    telemetry.close()
+
+# Scores copies of the individuals on all the data and adds them to the hall of fame, returns the copies
+def rescore(individuals, hall_of_fame):
+    individuals = [toolbox.clone(ind) for ind in individuals]
+    for ind, fit in zip(individuals, toolbox.map(toolbox.evaluate, individuals)):
+        ind.fitness.values = fit
+    telemetry.count("evaluations", len(individuals))
+    hall_of_fame.update(individuals)
+    return individuals
 
-# Placeholder for Examining Results 
-best_individual = tools.selBest(pop, 1)[0]
-print("Best Individual:", best_individual)
-print("Fitness:", best_individual.fitness.values[0])
+if __name__ == "__main__":
+    pop = main()
+    # Placeholder for Examining Results 
+    best_individual = tools.selBest(pop, 1)[0]
+    print("Best Individual:", best_individual)
+    print("Fitness:", best_individual.fitness.values[0])
 
 # *** Placeholder for HITL Integration ***
 # You'll add code to:
@@ -0,0 +1,90 @@
+import cProfile
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+# Lightweight instrumentation shared by the EA programs: phase timers, counters and one JSON line per generation
+#   with telemetry.timer("selection"): ...
+#   telemetry.count("simulations", len(tasks))
+#   telemetry.end_generation(generation, best=..., mean=...)
+# Timers and counters cost next to nothing, with no path the records are simply dropped
+class Telemetry:
+    def __init__(self, path: 'str' = None, program: 'str' = '', profile_generation: 'int' = None, keep_records: 'bool' = False):
+        # JSON Lines file every generation's record is appended to
+        self.path = path
+        # Name of the program the records come from, lets several programs share a file
+        self.program = program
+        # Generation to run under cProfile, its stats are dumped to <path>.gen<N>.prof (pstats, snakeviz). For py-spy
+        # attach to the process instead and line its samples up with the records' time stamps
+        self.profile_generation = profile_generation
+        # Records are also kept in memory when asked to, e.g. for the benchmark harness
+        self.records = [] if keep_records else None
+        self._file = None
+        self._profiler = None
+        self._generation_start = time.perf_counter()
+        self.timings: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+
+    # Telemetry configured through the environment: TELEMETRY_FILE and PROFILE_GENERATION
+    @classmethod
+    def from_environment(cls, program: 'str') -> 'Telemetry':
+        profile_generation = os.environ.get("PROFILE_GENERATION")
+        return cls(path=os.environ.get("TELEMETRY_FILE"), program=program, profile_generation=int(profile_generation) if profile_generation else None)
+
+    # Adds the wall time spent inside the with block to the phase
+    @contextmanager
+    def timer(self, phase: 'str'):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.perf_counter() - start)
+
+    # Adds time measured elsewhere (e.g. inside a worker process) to a phase
+    def add_time(self, phase: 'str', seconds: 'float'):
+        self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+
+    def count(self, counter: 'str', amount: 'int' = 1):
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    # Marks the start of a generation, starting the profiler if it is the one to profile
+    def start_generation(self, generation: 'int'):
+        self._generation_start = time.perf_counter()
+        if self.profile_generation == generation:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    # Writes the generation's record (timings, counters and the given fields) and starts over
+    def end_generation(self, generation: 'int', **fields):
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(f"{self.path or self.program}.gen{generation}.prof")
+            self._profiler = None
+        if self.path is not None or self.records is not None:
+            record = {
+                'program': self.program,
+                'generation': generation,
+                'time': time.time(),
+                'duration': time.perf_counter() - self._generation_start,
+                'timings': self.timings,
+                'counters': self.counters,
+                **fields,
+            }
+            if self.records is not None:
+                self.records.append(record)
+            if self.path is not None:
+                if self._file is None:
+                    self._file = open(self.path, 'a')
+                # default=float turns numpy scalars into plain numbers
+                self._file.write(json.dumps(record, default=float) + "\n")
+                self._file.flush()
+        self.timings = {}
+        self.counters = {}
+        self._generation_start = time.perf_counter()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,74 @@
+import os
+import pickle
+import random
+from tllogic_indiv import TLLogic
+from tllogic_set import TLLogicSet
+from typing import List, NamedTuple
+
+# Bumped whenever the layout of the checkpoint changes
+CHECKPOINT_VERSION = 2
+# File (inside the checkpoint directory) holding the population, generation counter and RNG state
+STATE_FILE_NAME = "state.pkl"
+# Append-only fitness cache file living next to the state, see FitnessCache
+CACHE_FILE_NAME = "fitness_cache.pkl"
+
+# Everything needed to carry on with an interrupted run
+class Checkpoint(NamedTuple):
+    # Number of generations bred and evaluated after the initial population
+    completed_generations: int
+    population: List[TLLogicSet]
+    random_state: tuple
+
+# Path of the fitness cache belonging to a checkpoint directory
+def checkpoint_cache_path(checkpoint_dir: 'str') -> str:
+    return os.path.join(checkpoint_dir, CACHE_FILE_NAME)
+
+def has_checkpoint(checkpoint_dir: 'str') -> bool:
+    return os.path.exists(os.path.join(checkpoint_dir, STATE_FILE_NAME))
+
+# Writes the population, generation counter and RNG state. The cache is flushed on its own (incrementally,
+# only the new entries) so the state file stays small: TLLogics shared between individuals are stored once
+def save_checkpoint(checkpoint_dir: 'str', completed_generations: 'int', population: List[TLLogicSet]):
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    tllogic_indices = {}
+    tllogic_payloads = []
+    individuals = []
+    for indiv in population:
+        indices = []
+        for tllogic in indiv.tllogics:
+            if id(tllogic) not in tllogic_indices:
+                tllogic_indices[id(tllogic)] = len(tllogic_payloads)
+                tllogic_payloads.append(tllogic.to_payload())
+            indices.append(tllogic_indices[id(tllogic)])
+        individuals.append((tuple(indices), indiv.fitness, indiv.metrics, indiv.case_fitnesses))
+    state = {
+        'version': CHECKPOINT_VERSION,
+        'completed_generations': completed_generations,
+        'tllogics': tllogic_payloads,
+        'individuals': individuals,
+        'random_state': random.getstate(),
+    }
+    # Write next to the old state and swap it in, a crash mid write leaves the previous checkpoint intact
+    state_path = os.path.join(checkpoint_dir, STATE_FILE_NAME)
+    temp_path = f"{state_path}.tmp"
+    with open(temp_path, 'wb') as file:
+        pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, state_path)
+
+# Reads a checkpoint back, restoring the sharing of TLLogics between individuals
+def load_checkpoint(checkpoint_dir: 'str') -> Checkpoint:
+    with open(os.path.join(checkpoint_dir, STATE_FILE_NAME), 'rb') as file:
+        state = pickle.load(file)
+    if state['version'] != CHECKPOINT_VERSION:
+        raise ValueError(f"Checkpoint in {checkpoint_dir} has version {state['version']}, expected {CHECKPOINT_VERSION}")
+    tllogics = [TLLogic.from_payload(payload) for payload in state['tllogics']]
+    population = []
+    for indices, fitness, metrics, case_fitnesses in state['individuals']:
+        indiv = TLLogicSet(tllogics=[tllogics[index] for index in indices])
+        indiv.fitness = fitness
+        indiv.metrics = metrics
+        indiv.case_fitnesses = case_fitnesses
+        population.append(indiv)
+    return Checkpoint(completed_generations=state['completed_generations'], population=population, random_state=state['random_state'])
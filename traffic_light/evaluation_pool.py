@@ -0,0 +1,104 @@
+import itertools
+import queue
+from multiprocessing import Pool
+from multiprocessing.util import Finalize
+from simulator_backend import Scenario, SimulationResult, SimulatorBackend
+from tllogic_set import TLLogicSet
+from typing import List, NamedTuple, Tuple
+
+# One simulation to run: an individual (at its slot in the population) on a scenario, within a step budget
+class EvaluationTask(NamedTuple):
+    index: int
+    indiv: TLLogicSet
+    # None runs the backend's default scenario
+    scenario: Scenario = None
+    # None runs until the network is empty
+    step_budget: int = None
+
+# Backend owned by the current worker process, created once when the worker starts
+_worker_backend = None
+
+# Runs once in every worker process; the backend (and its simulator) then lives as long as the worker
+def _initialize_worker(backend: 'SimulatorBackend'):
+    global _worker_backend
+    _worker_backend = backend
+    # Close the simulator when the worker shuts down
+    Finalize(backend, backend.close, exitpriority=10)
+
+# Runs a task on a backend
+def run_task(backend: 'SimulatorBackend', task: 'EvaluationTask') -> SimulationResult:
+    return backend.evaluate(task.index, task.indiv, step_budget=task.step_budget, scenario=task.scenario)
+
+# Evaluates a single (position, task) pair inside a worker
+def _evaluate_task(numbered_task: Tuple[int, 'EvaluationTask']) -> Tuple[int, SimulationResult]:
+    position, task = numbered_task
+    return position, run_task(_worker_backend, task)
+
+# Evaluates individuals on a bounded pool of long-lived worker processes
+class EvaluationPool:
+    def __init__(self, backend: 'SimulatorBackend', num_workers: 'int'):
+        self.backend = backend
+        self.num_workers = max(1, num_workers)
+        self._pool = None
+        # Tasks handed to submit() by number, and (task, result) pairs of the ones that finished
+        self._submitted = {}
+        self._task_numbers = itertools.count()
+        self._completed = queue.Queue()
+
+    # Whether individuals have to be written to network files before they can be evaluated
+    @property
+    def needs_network_files(self) -> bool:
+        return self.backend.needs_network_files
+
+    # Lazily start the workers so that an unused evaluator costs nothing
+    def _get_pool(self) -> Pool:
+        if self._pool is None:
+            self._pool = Pool(processes=self.num_workers, initializer=_initialize_worker, initargs=(self.backend,))
+        return self._pool
+
+    # Runs the given tasks and returns their results in the same order
+    # Runs longer than their step budget are aborted and come back censored
+    def evaluate(self, tasks: List['EvaluationTask']) -> List[SimulationResult]:
+        # A single worker runs in process, handy for debugging and profiling
+        if self.num_workers == 1:
+            return [run_task(self.backend, task) for task in tasks]
+        results = [None] * len(tasks)
+        # Simulation times vary wildly, hand out one task at a time so no worker idles
+        for position, result in self._get_pool().imap_unordered(_evaluate_task, enumerate(tasks), chunksize=1):
+            results[position] = result
+        return results
+
+    # Starts a task in the background without waiting for it, its result comes out of next_result()
+    def submit(self, task: 'EvaluationTask'):
+        if self.num_workers == 1:
+            self._completed.put((task, run_task(self.backend, task)))
+            return
+        number = next(self._task_numbers)
+        self._submitted[number] = task
+        self._get_pool().apply_async(_evaluate_task, ((number, task),), callback=self._task_done, error_callback=self._completed.put)
+
+    # Runs on the pool's result thread
+    def _task_done(self, numbered_result: Tuple[int, SimulationResult]):
+        number, result = numbered_result
+        self._completed.put((self._submitted.pop(number), result))
+
+    # Waits for any submitted task to finish and returns it with its result, in completion order
+    def next_result(self) -> Tuple['EvaluationTask', SimulationResult]:
+        completed = self._completed.get()
+        # A worker error comes through as the exception itself
+        if isinstance(completed, BaseException):
+            raise completed
+        return completed
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        self.backend.close()
+
+    def __enter__(self) -> 'EvaluationPool':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,134 @@
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+from simulator_backend import Scenario, SimulationResult
+from tllogic_set import TLLogicSet
+
+# Bytes of the blake2b digest used as the genome key
+GENOME_KEY_SIZE = 16
+
+# Normalizes a duration so that '26', 26 and '26.0' all hash the same
+def canonical_duration(duration) -> str:
+    return format(float(duration), 'g')
+
+# Canonical content hash of a TLLogicSet: every TLLogic id/offset and every Phase duration/state
+def genome_key(indiv: 'TLLogicSet') -> str:
+    digest = hashlib.blake2b(digest_size=GENOME_KEY_SIZE)
+    # Recombination may reorder the tllogics, the key must not depend on that order
+    for tllogic in sorted(indiv.tllogics, key=lambda tllogic: tllogic.id):
+        digest.update(f"{tllogic.id}\x1f{canonical_duration(tllogic.offset)}\x1e".encode())
+        for phase in tllogic.phases:
+            digest.update(f"{canonical_duration(phase.duration)}\x1f{phase.state}\x1e".encode())
+        digest.update(b"\x1d")
+    return digest.hexdigest()
+
+# Cache key of a genome's result on a scenario
+def scenario_key(genome: 'str', scenario: 'Scenario') -> str:
+    key = f"{genome}|{scenario.route_file}|{scenario.seed}"
+    # Full demand keeps the keys of before demand scaling existed
+    return key if scenario.demand_scale == 1.0 else f"{key}|x{scenario.demand_scale}"
+
+# Size bounded (LRU) map from genome keys to simulation results, optionally persisted across runs
+class FitnessCache:
+    def __init__(self, max_size: 'int', path: 'str' = None, context: 'str' = ''):
+        self.max_size = max_size
+        self.path = path
+        # Describes what the results were measured on (simulator, routes, ...); results from another context are ignored
+        self.context = context
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        # Entries added since the last flush to disk
+        self._pending = []
+        # Set when the file on disk can't be appended to and has to be rewritten
+        self._rewrite = False
+        if path is not None and os.path.exists(path):
+            self._load()
+
+    # Reads the append-only cache file: a header record followed by batches of (key, result) pairs
+    # Anything short of a clean end after a whole batch has the file rewritten on the next flush, appending behind
+    # damaged bytes would make the new batches unreadable too
+    def _load(self):
+        records = 0
+        with open(self.path, 'rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            # Where the record being read starts, None until the header is read
+            record_start = None
+            try:
+                if pickle.load(file) != self.context:
+                    print(f"Ignoring fitness cache {self.path}, it was recorded for a different simulation setup")
+                    self._rewrite = True
+                    return
+                while True:
+                    record_start = file.tell()
+                    for key, result in pickle.load(file):
+                        self._store(key, result)
+                        records += 1
+            except EOFError:
+                # Ran out of input inside a record rather than between two
+                if record_start != size:
+                    self._truncated()
+            except Exception:
+                self._truncated()
+        # Keep the file from growing forever when most of its records were evicted
+        if records > 2 * self.max_size:
+            self.compact()
+
+    # A run was killed mid write, everything before the damaged batch is still good
+    def _truncated(self):
+        print(f"Fitness cache {self.path} has a truncated tail, keeping {len(self._entries)} entries")
+        self._rewrite = True
+
+    def _store(self, key: 'str', result: 'SimulationResult'):
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    # Returns the cached result for a genome key, or None
+    def get(self, key: 'str') -> SimulationResult:
+        result = self._entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return result
+
+    def put(self, key: 'str', result: 'SimulationResult'):
+        self._store(key, result)
+        if self.path is not None:
+            self._pending.append((key, result))
+
+    # Appends the entries added since the last flush to the cache file
+    def flush(self):
+        if self.path is None or not self._pending:
+            return
+        if self._rewrite:
+            self.compact()
+            return
+        new_file = not os.path.exists(self.path)
+        with open(self.path, 'ab') as file:
+            if new_file:
+                pickle.dump(self.context, file)
+            pickle.dump(self._pending, file)
+        self._pending = []
+
+    # Rewrites the cache file with only the live entries
+    def compact(self):
+        if self.path is None:
+            return
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'wb') as file:
+            pickle.dump(self.context, file)
+            pickle.dump(list(self._entries.items()), file)
+        os.replace(temp_path, self.path)
+        self._pending = []
+        self._rewrite = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: 'str') -> bool:
+        return key in self._entries
@@ -0,0 +1,71 @@
+import queue
+from multiprocessing import Queue
+from tllogic_set import TLLogicSet
+from typing import List
+
+# Topologies islands can send their migrants over: "ring" to the next island only, "all" to every other island
+MIGRATION_TOPOLOGIES = ("ring", "all")
+
+# Islands an island sends its migrants to
+def migration_targets(island: 'int', num_islands: 'int', topology: 'str' = "ring") -> List[int]:
+    if topology not in MIGRATION_TOPOLOGIES:
+        raise ValueError(f"Unknown migration topology {topology!r}, expected one of {MIGRATION_TOPOLOGIES}")
+    if num_islands < 2:
+        return []
+    if topology == "ring":
+        return [(island + 1) % num_islands]
+    return [other for other in range(num_islands) if other != island]
+
+# One inbox per island, migrants are put in the inbox of the island they go to
+def create_inboxes(num_islands: 'int') -> List[Queue]:
+    return [Queue() for _ in range(num_islands)]
+
+# An island's end of the migration: every interval it posts copies of its best individuals to the inboxes of its
+# targets and takes in whatever has arrived in its own inbox since, in place of its worst individuals
+# Neither side ever waits, an island that is ahead just doesn't see its neighbours' newest migrants yet
+class Migration:
+    def __init__(self, island: 'int', inboxes: List[Queue], targets: List[int], interval: 'int', num_migrants: 'int'):
+        self.island = island
+        self.inbox = inboxes[island]
+        self.outboxes = [inboxes[target] for target in targets]
+        # Generations between migrations
+        self.interval = interval
+        # Individuals sent to every target per migration
+        self.num_migrants = num_migrants
+        self.sent = 0
+        self.received = 0
+
+    # Sends and receives migrants when the generation is due, replacing the worst individuals of the population in place
+    # Returns the number of immigrants taken in
+    def exchange(self, generation: 'int', population: List[TLLogicSet]) -> int:
+        if self.interval <= 0 or generation % self.interval != 0:
+            return 0
+        emigrants = sorted(population, key=lambda indiv: indiv.fitness)[:self.num_migrants]
+        # Genome payloads plus the scores, no need to pickle shared TLLogics over and over
+        message = [(indiv.to_payload(), indiv.fitness, indiv.case_fitnesses) for indiv in emigrants]
+        for outbox in self.outboxes:
+            outbox.put(message)
+        self.sent += len(message) * len(self.outboxes)
+        immigrants = []
+        while True:
+            try:
+                message = self.inbox.get_nowait()
+            except queue.Empty:
+                break
+            for payload, fitness, case_fitnesses in message:
+                immigrant = TLLogicSet.from_payload(payload)
+                immigrant.fitness = fitness
+                immigrant.case_fitnesses = case_fitnesses
+                immigrants.append(immigrant)
+        # Only the best immigrants when more arrived than the island can take in, its own best always stay
+        immigrants = sorted(immigrants, key=lambda indiv: indiv.fitness)[:max(0, len(population) - self.num_migrants)]
+        worst = sorted(range(len(population)), key=lambda index: population[index].fitness, reverse=True)
+        for index, immigrant in zip(worst, immigrants):
+            population[index] = immigrant
+        self.received += len(immigrants)
+        return len(immigrants)
+
+    # Lets the island's process exit without waiting for its last migrants to be picked up
+    def close(self):
+        for outbox in self.outboxes:
+            outbox.cancel_join_thread()
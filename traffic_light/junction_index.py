@@ -0,0 +1,31 @@
+from parse_traffic_light_logic_xml import NetworkTemplate
+from typing import List, Tuple
+
+# Where the TLLogics of every traffic light sit in a TLLogicSet. Every individual of a population lists its TLLogics
+# in the template's order, so one index built from the template serves them all
+# Recombination swaps whole blocks, a block is one traffic light: the positions of the TLLogics with its id, and with
+# it every junction it controls (a joined traffic light controls several). NetworkTemplate keeps one program per
+# id, so in sets bred from a template every block is a single TLLogic
+class JunctionIndex:
+    def __init__(self, tllogic_ids: List[str]):
+        self.tllogic_ids = list(tllogic_ids)
+        positions = {}
+        for position, tllogic_id in enumerate(self.tllogic_ids):
+            positions.setdefault(tllogic_id, []).append(position)
+        # Traffic light of every block and its TLLogics' positions, in the order the set lists them
+        self.block_ids = list(positions)
+        self.blocks: List[Tuple[int, ...]] = [tuple(block_positions) for block_positions in positions.values()]
+        # Block of every position
+        self.position_blocks = [0] * len(self.tllogic_ids)
+        for block, block_positions in enumerate(self.blocks):
+            for position in block_positions:
+                self.position_blocks[position] = block
+
+    # Index of a network's traffic lights, in the order of the template's TLLogics
+    @classmethod
+    def from_template(cls, template: 'NetworkTemplate') -> 'JunctionIndex':
+        return cls([tllogic.id for tllogic in template.parse_tl_logics()])
+
+    @property
+    def num_blocks(self) -> int:
+        return len(self.blocks)
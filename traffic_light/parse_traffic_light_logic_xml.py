@@ -1,18 +1,52 @@
+import io
+import re
 import xml.etree.ElementTree as ET
 from tllogic_indiv import TLLogic
-from typing import List
+from typing import Dict, Iterator, List, Tuple
+from xml.sax.saxutils import quoteattr
 
-def parse_tl_logic(xml_string):
-    root = ET.fromstring(xml_string)
-    tl_logics = []
+# Matches a whole tlLogic block in the raw bytes of a network file
+TL_LOGIC_BLOCK_PATTERN = re.compile(rb'<tlLogic\b.*?</tlLogic>', re.DOTALL)
 
-    for tl_logic_element in root.findall('.//tlLogic'):
-        tl_logic = TLLogic(tl_logic_element.attrib)
-        for phase_element in tl_logic_element.findall('phase'):
-            tl_logic.add_phase(phase_element)
-        tl_logics.append(tl_logic)
+# Builds a TLLogic from a tlLogic element
+def tl_logic_from_element(tl_logic_element) -> TLLogic:
+    tl_logic = TLLogic(tl_logic_element.attrib)
+    for phase_element in tl_logic_element.findall('phase'):
+        tl_logic.add_phase(phase_element)
+    return tl_logic
 
-    return tl_logics
+# Streams the top level elements with one of the given tags (tlLogic, junction, connection, ...) out of a network
+# (a file name or a file object) without ever holding the whole document: every top level element is dropped as
+# soon as it has been handled, so an element is only valid until the next one is yielded
+def iter_network_elements(source, tags: Tuple[str, ...]) -> Iterator[ET.Element]:
+    depth = 0
+    root = None
+    for event, element in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = element
+            depth += 1
+            continue
+        depth -= 1
+        # Only top level elements are complete, nested ones (phases, lanes, ...) are handled with their parent
+        if depth != 1:
+            continue
+        if element.tag in tags:
+            yield element
+        # Forget the edges, junctions, connections, ... parsed so far
+        root.clear()
+
+# Streams the TLLogics out of a network (a file name or a file object)
+def iter_tl_logics(source) -> Iterator[TLLogic]:
+    for element in iter_network_elements(source, ('tlLogic',)):
+        yield tl_logic_from_element(element)
+
+def parse_tl_logic(xml_string):
+    return list(iter_tl_logics(io.StringIO(xml_string)))
+
+# Streaming counterpart of parse_tl_logic for a network file on disk
+def parse_tl_logic_file(filename: 'str') -> List[TLLogic]:
+    return list(iter_tl_logics(filename))
 
 def write_tl_logic(xml_string, tl_logics: List[TLLogic]):
     root = ET.fromstring(xml_string)
@@ -45,6 +79,79 @@ def write_tl_logic(xml_string, tl_logics: List[TLLogic]):
 
     return ET.tostring(root, encoding='unicode')
 
+# Renders a TLLogic as a tlLogic block, indented like the template's blocks and their phases
+def render_tl_logic(tl_logic: TLLogic, indent: 'str' = '\t', phase_indent: 'str' = None, newline: 'str' = '\n') -> str:
+    phase_indent = phase_indent if phase_indent is not None else indent + '\t'
+    lines = [f"<tlLogic id={quoteattr(tl_logic.id)} type={quoteattr(tl_logic.type)} programID={quoteattr(tl_logic.programID)} offset={quoteattr(str(tl_logic.offset))}>"]
+    for phase in tl_logic.phases:
+        lines.append(f"{phase_indent}<phase duration={quoteattr(str(phase.duration))} state={quoteattr(phase.state)}/>")
+    lines.append(f"{indent}</tlLogic>")
+    return newline.join(lines)
+
+# A network file parsed once, individual networks are produced by splicing regenerated tlLogic blocks into it
+class NetworkTemplate:
+    def __init__(self, xml_bytes: 'bytes'):
+        self.xml_bytes = xml_bytes
+        # Index of the template's tlLogics by id, in document order: the byte span of each block for the write path
+        # and the parsed TLLogic for the read path, so only the tlLogic blocks are ever parsed. Only one program per
+        # id is supported, a later tlLogic with the same id (another programID) replaces the earlier one
+        self.spans: Dict[str, Tuple[int, int]] = {}
+        self.tl_logics: Dict[str, TLLogic] = {}
+        for match in TL_LOGIC_BLOCK_PATTERN.finditer(xml_bytes):
+            tl_logic = tl_logic_from_element(ET.fromstring(match.group()))
+            self.spans[tl_logic.id] = match.span()
+            self.tl_logics[tl_logic.id] = tl_logic
+        # Reuse the whitespace in front of the first block and its first phase, and the line endings, so spliced
+        # files look like the template
+        self.indent = '\t'
+        self.phase_indent = None
+        self.newline = '\n'
+        if self.spans:
+            first_start, first_end = min(self.spans.values())
+            line_start = xml_bytes.rfind(b'\n', 0, first_start) + 1
+            self.indent = xml_bytes[line_start:first_start].decode()
+            phase_start = xml_bytes.find(b'<phase', first_start, first_end)
+            if phase_start != -1:
+                phase_line_start = xml_bytes.rfind(b'\n', 0, phase_start) + 1
+                self.phase_indent = xml_bytes[phase_line_start:phase_start].decode()
+                if xml_bytes[phase_line_start - 2:phase_line_start] == b'\r\n':
+                    self.newline = '\r\n'
+
+    @classmethod
+    def from_file(cls, filename: 'str') -> 'NetworkTemplate':
+        with open(filename, 'rb') as file:
+            return cls(file.read())
+
+    # The template's TLLogics in document order; shared with the index, so don't change them in place
+    def parse_tl_logics(self) -> List[TLLogic]:
+        return list(self.tl_logics.values())
+
+    # Streams the template's top level elements with one of the given tags, see iter_network_elements
+    def iter_elements(self, tags: Tuple[str, ...]) -> Iterator[ET.Element]:
+        return iter_network_elements(io.BytesIO(self.xml_bytes), tags)
+
+    # Returns the template bytes with the tlLogic blocks of the given TLLogics replaced
+    def render(self, tl_logics: List[TLLogic]) -> bytes:
+        # Only TLLogics the template knows about can be spliced in, same as write_tl_logic
+        replacements = sorted(((self.spans[tl_logic.id], tl_logic) for tl_logic in tl_logics if tl_logic.id in self.spans), key=lambda replacement: replacement[0])
+        chunks = []
+        position = 0
+        for (start, end), tl_logic in replacements:
+            chunks.append(self.xml_bytes[position:start])
+            # TLLogics are never changed in place, the template's own still match its bytes exactly
+            if self.tl_logics[tl_logic.id] is tl_logic:
+                chunks.append(self.xml_bytes[start:end])
+            else:
+                chunks.append(render_tl_logic(tl_logic, indent=self.indent, phase_indent=self.phase_indent, newline=self.newline).encode())
+            position = end
+        chunks.append(self.xml_bytes[position:])
+        return b''.join(chunks)
+
+    # Writes the network of the given TLLogics to a file (point it at tmpfs, e.g. /dev/shm, to keep it off disk)
+    def write(self, filename: 'str', tl_logics: List[TLLogic]):
+        with open(filename, 'wb') as file:
+            file.write(self.render(tl_logics))
+
 # # Example usage
 # xml_file = 'traffic_light/network_configs/grid_network_original.net.xml'
 # with open(xml_file, 'r') as file:
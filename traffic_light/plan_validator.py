@@ -0,0 +1,120 @@
+from parse_traffic_light_logic_xml import NetworkTemplate
+from tllogic_indiv import (GREEN_NO_PRI_LIGHT, GREEN_TURN_ARROW_LIGHT, GREEN_YES_PRI_LIGHT, OFF_BLINKING_LIGHT, OFF_NO_SIGNAL_LIGHT,
+                           RED_LIGHT, RED_PLUS_YELLOW_LIGHT, YELLOW_LIGHT, TLLogic)
+from tllogic_set import TLLogicSet
+from typing import Dict, List, Set
+
+# Lights a link may be driven on
+GREEN_LIGHTS = {GREEN_YES_PRI_LIGHT, GREEN_NO_PRI_LIGHT, GREEN_TURN_ARROW_LIGHT}
+# Lights that let some traffic through, vehicles can get going on an unsignalled (off) link too
+PASSABLE_LIGHTS = GREEN_LIGHTS | {OFF_BLINKING_LIGHT, OFF_NO_SIGNAL_LIGHT}
+# Lights that stop the traffic
+STOP_LIGHTS = {RED_LIGHT, RED_PLUS_YELLOW_LIGHT}
+
+# Checks signal plans against the conflicts of the network before they are simulated, the rules:
+#   - every link gets some green (or goes unsignalled) at some point of the cycle
+#   - two links that cross (foes at their junction) are never both green with priority ('G') in the same phase
+#   - a green link goes through yellow before it turns red
+# Plans that break them gridlock or crash, SUMO would just spend a whole run finding out
+class PlanValidator:
+    def __init__(self, foes: Dict[str, Dict[int, Set[int]]]):
+        # TLLogic id -> link index -> link indices of the same TLLogic crossing it
+        self.foes = foes
+        # Per TLLogic its links in order and every crossing pair once (lower link first), what the checks loop over
+        self._links = {tl: sorted(link_foes) for tl, link_foes in foes.items()}
+        self._foe_pairs = {tl: sorted((link, foe) for link, link_foes in tl_foes.items() for foe in link_foes if link < foe) for tl, tl_foes in foes.items()}
+
+    # Reads the conflicts out of a network: every signalled connection's internal lane (via ":<junction>_<request>_<lane>")
+    # names its request at the junction, and the request's foes say which others cross it (bit i, from the right, is request i)
+    @classmethod
+    def from_template(cls, template: 'NetworkTemplate') -> 'PlanValidator':
+        junction_foes = {}
+        links = []
+        for element in template.iter_elements(('junction', 'connection')):
+            if element.tag == 'junction':
+                junction_foes[element.get('id')] = {int(request.get('index')): request.get('foes') for request in element.findall('request')}
+            elif element.get('tl') is not None and element.get('via') is not None:
+                junction, request, _ = element.get('via')[1:].rsplit('_', 2)
+                links.append((element.get('tl'), int(element.get('linkIndex')), junction, int(request)))
+        # Links only cross links of their own junction and traffic light, pair them up within those groups only
+        groups = {}
+        for tl, link_index, junction, request in links:
+            groups.setdefault((tl, junction), []).append((link_index, request))
+        foes = {}
+        for (tl, junction), group in groups.items():
+            tl_foes = foes.setdefault(tl, {})
+            for link_index, request in group:
+                link_foes = tl_foes.setdefault(link_index, set())
+                request_foes = junction_foes.get(junction, {}).get(request, '')
+                for other_link_index, other_request in group:
+                    if other_request < len(request_foes) and request_foes[-1 - other_request] == '1':
+                        link_foes.add(other_link_index)
+        return cls(foes)
+
+    # Descriptions of the rules a TLLogic breaks, empty when it is valid
+    def violations(self, tllogic: 'TLLogic') -> List[str]:
+        links = self._links.get(tllogic.id)
+        if links is None or not tllogic.phases:
+            return []
+        states = [phase.state for phase in tllogic.phases]
+        # Links past the end of a (malformed) state are left alone
+        length = min(len(state) for state in states)
+        links = [link for link in links if link < length]
+        violations = []
+        for link in links:
+            if not any(state[link] in PASSABLE_LIGHTS for state in states):
+                violations.append(f"link {link} never gets green")
+        for phase_index, state in enumerate(states):
+            for link, foe in self._foe_pairs[tllogic.id]:
+                if foe < length and state[link] == GREEN_YES_PRI_LIGHT and state[foe] == GREEN_YES_PRI_LIGHT:
+                    violations.append(f"links {link} and {foe} conflict in phase {phase_index}")
+            if len(states) > 1:
+                next_state = states[(phase_index + 1) % len(states)]
+                for link in links:
+                    if state[link] in GREEN_LIGHTS and next_state[link] in STOP_LIGHTS:
+                        violations.append(f"link {link} goes from green to red without yellow after phase {phase_index}")
+        return violations
+
+    def is_valid(self, indiv: 'TLLogicSet') -> bool:
+        return not any(self.violations(tllogic) for tllogic in indiv.tllogics)
+
+    # Fixes a TLLogic with the smallest changes that satisfy the rules: a link without green gets a yielding green
+    # ('g') in the longest phase, the later of two conflicting priority greens yields ('G' -> 'g'), and a red right
+    # after a green turns yellow. Returns the TLLogic itself when it is valid, a new one (copy-on-write) otherwise
+    def repair_tllogic(self, tllogic: 'TLLogic') -> 'TLLogic':
+        links = self._links.get(tllogic.id)
+        if links is None or not tllogic.phases:
+            return tllogic
+        states = [list(phase.state) for phase in tllogic.phases]
+        length = min(len(state) for state in states)
+        links = [link for link in links if link < length]
+        longest = max(range(len(states)), key=lambda index: float(tllogic.phases[index].duration))
+        for link in links:
+            if not any(state[link] in PASSABLE_LIGHTS for state in states):
+                states[longest][link] = GREEN_NO_PRI_LIGHT
+        for state in states:
+            for link, foe in self._foe_pairs[tllogic.id]:
+                if foe < length and state[link] == GREEN_YES_PRI_LIGHT and state[foe] == GREEN_YES_PRI_LIGHT:
+                    state[foe] = GREEN_NO_PRI_LIGHT
+        if len(states) > 1:
+            for phase_index, state in enumerate(states):
+                next_state = states[(phase_index + 1) % len(states)]
+                for link in links:
+                    if state[link] in GREEN_LIGHTS and next_state[link] in STOP_LIGHTS:
+                        next_state[link] = YELLOW_LIGHT
+        repaired = None
+        for phase_index, (phase, state) in enumerate(zip(tllogic.phases, states)):
+            state = ''.join(state)
+            if state != phase.state:
+                if repaired is None:
+                    repaired = tllogic.copy()
+                repaired.phases[phase_index] = phase.copy()
+                repaired.phases[phase_index].state = state
+        return repaired if repaired is not None else tllogic
+
+    # Repairs every TLLogic of an individual, returns the individual itself when nothing needed fixing
+    def repair(self, indiv: 'TLLogicSet') -> 'TLLogicSet':
+        tllogics = [self.repair_tllogic(tllogic) for tllogic in indiv.tllogics]
+        if all(repaired is tllogic for repaired, tllogic in zip(tllogics, indiv.tllogics)):
+            return indiv
+        return TLLogicSet(tllogics=tllogics)
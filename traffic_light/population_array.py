@@ -0,0 +1,146 @@
+import numpy as np
+from junction_index import JunctionIndex
+from tllogic_indiv import DURATION_ATTR, GREEN_TURN_ARROW_LIGHT, MAX_LIGHT_DURATION, MIN_LIGHT_DURATION, PHASE_STATE_OPTIONS, STATE_ATTR, Phase, TLLogic
+from tllogic_set import TLLogicSet
+from typing import List
+
+# Every light a state can hold, by code. The mutation options come first so codes below
+# len(PHASE_STATE_OPTIONS) are exactly what Phase.mutate may pick; the rest only round trip
+STATE_ALPHABET = PHASE_STATE_OPTIONS + [GREEN_TURN_ARROW_LIGHT]
+STATE_CODES = {light: code for code, light in enumerate(STATE_ALPHABET)}
+# Code filling the tail of states shorter than the longest state
+PAD_STATE_CODE = 255
+
+# Formats a duration the way it would be written in a network file
+def format_duration(duration: 'float') -> str:
+    return str(int(duration)) if float(duration).is_integer() else repr(float(duration))
+
+# Structure shared by every individual of a population: which TLLogics there are and how their phases are laid out
+class PopulationLayout:
+    def __init__(self, template: 'TLLogicSet', junction_index: 'JunctionIndex' = None):
+        self.tllogic_attribs = [{'id': tllogic.id, 'type': tllogic.type, 'programID': tllogic.programID} for tllogic in template.tllogics]
+        self.phase_counts = np.array([len(tllogic.phases) for tllogic in template.tllogics], dtype=np.int64)
+        # First phase column of each TLLogic
+        self.phase_starts = np.concatenate(([0], np.cumsum(self.phase_counts)[:-1])).astype(np.int64)
+        # TLLogic each phase column belongs to
+        self.phase_tllogic = np.repeat(np.arange(len(self.phase_counts)), self.phase_counts)
+        self.state_lengths = np.array([len(phase.state) for tllogic in template.tllogics for phase in tllogic.phases], dtype=np.int64)
+        self.max_state_length = int(self.state_lengths.max()) if len(self.state_lengths) else 0
+        # Junction block each TLLogic belongs to, blocks are what recombination swaps (same blocks as TLLogicSet.recombine)
+        if junction_index is None:
+            junction_index = JunctionIndex([tllogic.id for tllogic in template.tllogics])
+        self.tllogic_junction = np.array(junction_index.position_blocks, dtype=np.int64)
+        self.num_junctions = junction_index.num_blocks
+
+    @property
+    def num_tllogics(self) -> int:
+        return len(self.tllogic_attribs)
+
+    @property
+    def num_phases(self) -> int:
+        return len(self.state_lengths)
+
+    # Whether a TLLogicSet has exactly this layout (same TLLogics in the same order, same phase and state sizes)
+    def matches(self, indiv: 'TLLogicSet') -> bool:
+        if [tllogic.id for tllogic in indiv.tllogics] != [attrib['id'] for attrib in self.tllogic_attribs]:
+            return False
+        state_lengths = [len(phase.state) for tllogic in indiv.tllogics for phase in tllogic.phases]
+        return len(state_lengths) == self.num_phases and np.array_equal(state_lengths, self.state_lengths)
+
+# A whole population as arrays: a duration matrix, a state code tensor, offsets and fitnesses
+class PopulationArray:
+    def __init__(self, layout: 'PopulationLayout', durations: 'np.ndarray', states: 'np.ndarray', offsets: 'np.ndarray', fitnesses: 'np.ndarray' = None):
+        self.layout = layout
+        # (individuals, phases) durations in seconds
+        self.durations = durations
+        # (individuals, phases, max state length) codes into STATE_ALPHABET, padded with PAD_STATE_CODE
+        self.states = states
+        # (individuals, tllogics) offsets
+        self.offsets = offsets
+        self.fitnesses = fitnesses if fitnesses is not None else np.zeros(len(durations))
+
+    def __len__(self) -> int:
+        return len(self.durations)
+
+    @classmethod
+    def from_tllogic_sets(cls, population: List['TLLogicSet'], layout: 'PopulationLayout' = None) -> 'PopulationArray':
+        if layout is None:
+            layout = PopulationLayout(population[0])
+        durations = np.empty((len(population), layout.num_phases), dtype=np.float64)
+        states = np.full((len(population), layout.num_phases, layout.max_state_length), PAD_STATE_CODE, dtype=np.uint8)
+        offsets = np.empty((len(population), layout.num_tllogics), dtype=np.float64)
+        fitnesses = np.empty(len(population), dtype=np.float64)
+        for row, indiv in enumerate(population):
+            if not layout.matches(indiv):
+                raise ValueError(f"Individual {row} does not have the population's layout")
+            phases = [phase for tllogic in indiv.tllogics for phase in tllogic.phases]
+            durations[row] = [float(phase.duration) for phase in phases]
+            for column, phase in enumerate(phases):
+                states[row, column, :len(phase.state)] = [STATE_CODES[light] for light in phase.state]
+            offsets[row] = [float(tllogic.offset) for tllogic in indiv.tllogics]
+            fitnesses[row] = indiv.fitness
+        return cls(layout, durations, states, offsets, fitnesses)
+
+    # Converts the arrays back into TLLogicSets
+    def to_tllogic_sets(self) -> List['TLLogicSet']:
+        layout = self.layout
+        population = []
+        for row in range(len(self)):
+            tllogics = []
+            for tllogic_index, attrib in enumerate(layout.tllogic_attribs):
+                tllogic = TLLogic({**attrib, 'offset': format_duration(self.offsets[row, tllogic_index])})
+                start = layout.phase_starts[tllogic_index]
+                for column in range(start, start + layout.phase_counts[tllogic_index]):
+                    state = ''.join(STATE_ALPHABET[code] for code in self.states[row, column, :layout.state_lengths[column]])
+                    tllogic.phases.append(Phase({DURATION_ATTR: format_duration(self.durations[row, column]), STATE_ATTR: state}))
+                tllogics.append(tllogic)
+            tllogic_set = TLLogicSet(tllogics=tllogics)
+            # Fitnesses are step counts, hand them back as ints
+            fitness = self.fitnesses[row].item()
+            tllogic_set.fitness = int(fitness) if fitness.is_integer() else fitness
+            population.append(tllogic_set)
+        return population
+
+    # New population made of the given rows (e.g. the result of a selection)
+    def take(self, rows: 'np.ndarray') -> 'PopulationArray':
+        return PopulationArray(self.layout, self.durations[rows], self.states[rows], self.offsets[rows], self.fitnesses[rows])
+
+    # Batched TLLogicSet.mutate: every TLLogic of every individual mutates one random phase with probability mutation_rate,
+    # that phase either gets a new duration or one of its lights changed, half of the time each
+    def mutate(self, mutation_rate: 'float', rng: 'np.random.Generator' = None):
+        rng = rng if rng is not None else np.random.default_rng()
+        layout = self.layout
+        rows, tllogics = np.nonzero(rng.random((len(self), layout.num_tllogics)) <= mutation_rate)
+        columns = layout.phase_starts[tllogics] + (rng.random(len(rows)) * layout.phase_counts[tllogics]).astype(np.int64)
+        mutate_state = rng.random(len(rows)) < 0.5
+        # Lights of the chosen phases
+        state_rows, state_columns = rows[mutate_state], columns[mutate_state]
+        lights = (rng.random(len(state_rows)) * layout.state_lengths[state_columns]).astype(np.int64)
+        self.states[state_rows, state_columns, lights] = rng.integers(0, len(PHASE_STATE_OPTIONS), size=len(state_rows), dtype=np.uint8)
+        # Durations of the others
+        duration_rows, duration_columns = rows[~mutate_state], columns[~mutate_state]
+        self.durations[duration_rows, duration_columns] = rng.integers(MIN_LIGHT_DURATION, MAX_LIGHT_DURATION + 1, size=len(duration_rows))
+
+    # Batched TLLogicSet.recombine: every (first_parents[i], second_parents[i]) pair swaps a random non empty
+    # subset of its junction blocks, returns the two populations of children
+    def recombine(self, first_parents: 'np.ndarray', second_parents: 'np.ndarray', rng: 'np.random.Generator' = None):
+        rng = rng if rng is not None else np.random.default_rng()
+        layout = self.layout
+        num_pairs = len(first_parents)
+        # Swap between 1 and all junctions, picked by ranking random keys
+        num_swaps = rng.integers(1, layout.num_junctions + 1, size=num_pairs)
+        ranks = rng.random((num_pairs, layout.num_junctions)).argsort(axis=1).argsort(axis=1)
+        swap_junctions = ranks < num_swaps[:, None]
+        swap_tllogics = swap_junctions[:, layout.tllogic_junction]
+        swap_phases = swap_tllogics[:, layout.phase_tllogic]
+        first, second = self.take(first_parents), self.take(second_parents)
+        children = []
+        for own, other in ((first, second), (second, first)):
+            children.append(PopulationArray(
+                layout,
+                np.where(swap_phases, other.durations, own.durations),
+                np.where(swap_phases[:, :, None], other.states, own.states),
+                np.where(swap_tllogics, other.offsets, own.offsets),
+                own.fitnesses.copy(),
+            ))
+        return children[0], children[1]
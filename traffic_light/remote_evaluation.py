@@ -0,0 +1,232 @@
+import argparse
+import ipaddress
+import itertools
+import os
+import queue
+import socket
+import threading
+from evaluation_pool import EvaluationTask, run_task
+from multiprocessing import AuthenticationError, Process
+from multiprocessing.connection import Client, Listener
+from simulator_backend import SimulationResult, SimulatorBackend, StandInBackend
+from tllogic_set import TLLogicSet
+from typing import Iterator, List, Tuple
+
+# Messages are pickled tuples sent over multiprocessing connections (length prefixed, HMAC authenticated):
+#   worker -> dispatcher: ('hello', name), ('heartbeat',), ('result', SimulationResult)
+#   dispatcher -> worker: ('task', index, genome payload, scenario, step budget), ('shutdown',)
+# Pickles are only safe between trusted machines, keep the port off the public network and use your own authkey
+DEFAULT_PORT = 6000
+# Public (it is in the repository), so only accepted on loopback addresses, see check_authkey
+DEFAULT_AUTHKEY = b'rmec-sg'
+# Environment variable the command lines take the authkey from when --authkey isn't given
+AUTHKEY_ENVIRONMENT_VARIABLE = "RMEC_AUTHKEY"
+# A busy worker sends a heartbeat this often (seconds)...
+HEARTBEAT_INTERVAL = 5.0
+# ...and is given up on (its task handed to another worker) after this long without one
+HEARTBEAT_TIMEOUT = 30.0
+# How often idle parts of the dispatcher look up from their queues to check for shutdown (seconds)
+POLL_INTERVAL = 0.5
+
+# Evaluates tasks on remote workers connected over TCP, same interface as EvaluationPool
+# Listens on this machine only by default, serving other machines (e.g. host '' for every interface) takes your own authkey
+class RemoteEvaluationPool:
+    # Workers receive genomes, not files, so they must run a backend that doesn't need network files
+    needs_network_files = False
+
+    def __init__(self, address: Tuple[str, int] = ('localhost', DEFAULT_PORT), authkey: 'bytes' = DEFAULT_AUTHKEY, heartbeat_timeout: 'float' = HEARTBEAT_TIMEOUT):
+        check_authkey(address, authkey)
+        self.heartbeat_timeout = heartbeat_timeout
+        self._listener = Listener(address, authkey=authkey)
+        self.address = self._listener.address
+        # (batch, position, task) waiting for a worker, lost tasks are put back. Tasks from submit()
+        # have no batch (None) and are their own position
+        self._tasks = queue.Queue()
+        # (batch, position, result) coming back from the workers
+        self._results = queue.Queue()
+        self._batches = itertools.count()
+        self._closed = threading.Event()
+        self.num_workers = 0
+        self._lock = threading.Lock()
+        threading.Thread(target=self._accept_workers, daemon=True).start()
+
+    def _accept_workers(self):
+        while not self._closed.is_set():
+            try:
+                connection = self._listener.accept()
+            except AuthenticationError:
+                print("Rejected a remote worker with the wrong authkey")
+                continue
+            except (EOFError, OSError):
+                # Only a closed listener ends the loop, a client dropping mid handshake just loses its connection
+                if self._closed.is_set():
+                    return
+                continue
+            threading.Thread(target=self._serve_worker, args=(connection,), daemon=True).start()
+
+    # Feeds one worker with tasks until it goes quiet, disconnects or the pool closes
+    def _serve_worker(self, connection):
+        item = None
+        try:
+            _, name = connection.recv()
+            with self._lock:
+                self.num_workers += 1
+            print(f"Remote worker {name} connected")
+            while not self._closed.is_set():
+                try:
+                    item = self._tasks.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    continue
+                batch, position, task = item
+                connection.send(('task', task.index, task.indiv.to_payload(), task.scenario, task.step_budget))
+                while True:
+                    if not connection.poll(self.heartbeat_timeout):
+                        raise TimeoutError(f"no heartbeat from {name} in {self.heartbeat_timeout}s")
+                    message = connection.recv()
+                    if message[0] == 'result':
+                        self._results.put((batch, position, message[1]))
+                        item = None
+                        break
+            connection.send(('shutdown',))
+        except (EOFError, OSError, TimeoutError) as error:
+            print(f"Lost a remote worker: {error!r}")
+        finally:
+            # Whatever the worker was running goes to somebody else
+            if item is not None:
+                self._tasks.put(item)
+            with self._lock:
+                self.num_workers -= 1
+            connection.close()
+
+    # Hands the tasks to the workers and yields (position, result) pairs as soon as they come back
+    def evaluate_stream(self, tasks: List['EvaluationTask']) -> Iterator[Tuple[int, SimulationResult]]:
+        batch = next(self._batches)
+        for position, task in enumerate(tasks):
+            self._tasks.put((batch, position, task))
+        received = set()
+        while len(received) < len(tasks):
+            result_batch, position, result = self._results.get()
+            # Skip leftovers of an earlier, abandoned batch
+            if result_batch != batch or position in received:
+                continue
+            received.add(position)
+            yield position, result
+
+    # Starts a task without waiting for it, its result comes out of next_result()
+    # Don't mix with evaluate(), a batch throws away results that aren't its own
+    def submit(self, task: 'EvaluationTask'):
+        self._tasks.put((None, task, task))
+
+    # Waits for any submitted task to finish and returns it with its result, in completion order
+    def next_result(self) -> Tuple['EvaluationTask', SimulationResult]:
+        while True:
+            batch, task, result = self._results.get()
+            if batch is None:
+                return task, result
+
+    # Runs the given tasks and returns their results in the same order
+    def evaluate(self, tasks: List['EvaluationTask']) -> List[SimulationResult]:
+        results = [None] * len(tasks)
+        for position, result in self.evaluate_stream(tasks):
+            results[position] = result
+        return results
+
+    def close(self):
+        self._closed.set()
+        self._listener.close()
+
+    def __enter__(self) -> 'RemoteEvaluationPool':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+# Connects to a dispatcher and evaluates the tasks it sends with the backend until told to stop
+def run_worker(address: Tuple[str, int], backend: 'SimulatorBackend', authkey: 'bytes' = DEFAULT_AUTHKEY, heartbeat_interval: 'float' = HEARTBEAT_INTERVAL):
+    check_authkey(address, authkey)
+    connection = Client(address, authkey=authkey)
+    # The heartbeat thread and the main thread share the connection
+    send_lock = threading.Lock()
+
+    def send(message: tuple):
+        with send_lock:
+            connection.send(message)
+
+    def send_heartbeats(done: 'threading.Event'):
+        while not done.wait(heartbeat_interval):
+            send(('heartbeat',))
+
+    try:
+        send(('hello', f"{socket.gethostname()}:{os.getpid()}"))
+        while True:
+            message = connection.recv()
+            if message[0] == 'shutdown':
+                break
+            _, index, payload, scenario, step_budget = message
+            done = threading.Event()
+            heartbeat = threading.Thread(target=send_heartbeats, args=(done,), daemon=True)
+            heartbeat.start()
+            try:
+                result = run_task(backend, EvaluationTask(index=index, indiv=TLLogicSet.from_payload(payload), scenario=scenario, step_budget=step_budget))
+            finally:
+                done.set()
+                heartbeat.join()
+            send(('result', result))
+    except EOFError:
+        # The dispatcher went away
+        pass
+    finally:
+        backend.close()
+        connection.close()
+
+# Starts count worker processes on this machine, e.g. to try the protocol out with the stand-in simulator
+def start_local_workers(address: Tuple[str, int], backend: 'SimulatorBackend', count: 'int', authkey: 'bytes' = DEFAULT_AUTHKEY) -> List[Process]:
+    workers = [Process(target=run_worker, args=(address, backend, authkey), daemon=True) for _ in range(count)]
+    for worker in workers:
+        worker.start()
+    return workers
+
+# Whether a host name or address only reaches this machine ('' listens on every interface, so it doesn't)
+def is_loopback(host: 'str') -> bool:
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+# Both ends unpickle whatever the other sends, the public DEFAULT_AUTHKEY is only good enough when nobody else can
+# reach the port. Raises ValueError when it is used for any other address
+def check_authkey(address: Tuple[str, int], authkey: 'bytes'):
+    if authkey == DEFAULT_AUTHKEY and not is_loopback(address[0]):
+        raise ValueError(f"{address[0] or 'every interface'} is reachable from other machines, set your own authkey "
+                         f"(--authkey or {AUTHKEY_ENVIRONMENT_VARIABLE}) instead of the public default")
+
+# Authkey given on the command line, from the environment, or the default
+def authkey_from_argument(authkey: 'str' = None) -> bytes:
+    authkey = authkey or os.environ.get(AUTHKEY_ENVIRONMENT_VARIABLE)
+    return authkey.encode() if authkey else DEFAULT_AUTHKEY
+
+# Parses host:port
+def parse_address(address: 'str') -> Tuple[str, int]:
+    host, _, port = address.rpartition(':')
+    return host, int(port)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate traffic light plans for a remote traffic_light_ec run")
+    parser.add_argument("--connect", required=True, help="host:port the dispatcher listens on")
+    parser.add_argument("--processes", type=int, default=1, help="number of simulations to run in parallel on this machine")
+    parser.add_argument("--authkey", help=f"shared secret of the dispatcher (default: ${AUTHKEY_ENVIRONMENT_VARIABLE}), required unless it runs on this machine")
+    parser.add_argument("--stand-in", action="store_true", help="score plans with the stand-in simulator instead of SUMO")
+    args = parser.parse_args()
+    address = parse_address(args.connect)
+    authkey = authkey_from_argument(args.authkey)
+    check_authkey(address, authkey)
+    if args.stand_in:
+        worker_backend = StandInBackend()
+    else:
+        # Genomes arrive without network files, SUMO has to take the programs in through TraCI
+        from traffic_light_ec import create_backend
+        worker_backend = create_backend(inject_programs=True)
+    for worker in start_local_workers(address, worker_backend, count=args.processes, authkey=authkey):
+        worker.join()
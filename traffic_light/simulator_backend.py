@@ -0,0 +1,206 @@
+import hashlib
+from time import perf_counter, sleep
+from tllogic_set import TLLogicSet
+from traffic_metrics import MetricsCollector, TrafficMetrics
+from typing import Dict, List, NamedTuple
+
+# A demand pattern plans are scored on: a route file and the seed SUMO runs it with
+class Scenario(NamedTuple):
+    name: str
+    route_file: str
+    # None leaves SUMO on its own default seed
+    seed: int = None
+    # Share of the route file's vehicles that are inserted, below 1 thins the demand out (cheaper, less exact runs)
+    demand_scale: float = 1.0
+
+    # Command line arguments selecting the scenario
+    def sumo_args(self) -> List[str]:
+        args = ["-r", self.route_file]
+        if self.seed is not None:
+            args += ["--seed", str(self.seed)]
+        if self.demand_scale != 1.0:
+            args += ["--scale", str(self.demand_scale)]
+        return args
+
+# Result of evaluating one individual in a simulator
+class SimulationResult(NamedTuple):
+    # Number of simulation steps until every vehicle left the network (lower is better)
+    fitness: int
+    # Whether the run was stopped at its step budget; the fitness is then only a lower bound
+    censored: bool = False
+    # Step budget a censored run was stopped at
+    step_budget: int = None
+    # Traffic metrics of the run, when the backend collects them
+    metrics: TrafficMetrics = None
+    # Wall time (seconds) the worker spent in each part of the run, e.g. loading the network and stepping
+    timings: Dict[str, float] = None
+
+# Fitness given to a run stopped at its step budget: the budget plus the vehicles still waiting to finish,
+# so among aborted plans the ones closer to clearing the network still rank better
+def censored_result(step_budget: 'int', remaining_vehicles: 'int') -> SimulationResult:
+    return SimulationResult(fitness=step_budget + remaining_vehicles, censored=True, step_budget=step_budget)
+
+# Interface every simulator backend implements so the evaluator does not care what runs the plans
+class SimulatorBackend:
+    # Whether every individual needs its own network file written before it is evaluated
+    needs_network_files = False
+
+    # Evaluates an individual on a scenario (the backend's default one if None), index is the individual's slot in the population
+    # With a step budget the run is aborted (and its result censored) once it takes more steps than that
+    def evaluate(self, index: 'int', indiv: 'TLLogicSet', step_budget: 'int' = None, scenario: 'Scenario' = None) -> SimulationResult:
+        raise NotImplementedError
+
+    # Describes what the backend measures, cached fitnesses are only reused for the same description
+    def cache_context(self) -> str:
+        return self.__class__.__name__
+
+    # Releases whatever the backend holds on to (simulator instances, files, ...)
+    def close(self):
+        pass
+
+# Runs the individuals in SUMO through libsumo, keeping a single simulator instance alive per process
+class SumoBackend(SimulatorBackend):
+    needs_network_files = True
+
+    def __init__(self, sumo_cmd: List[str], network_file_pattern: 'str', default_scenario: 'Scenario' = None, collect_metrics: 'bool' = False, metrics_sample_interval: 'int' = 1):
+        self.sumo_cmd = list(sumo_cmd)
+        self.network_file_pattern = network_file_pattern
+        # Scenario of evaluations that don't ask for one; without it sumo_cmd has to bring its own routes
+        self.default_scenario = default_scenario
+        # Collect waiting time, halting, time loss and throughput on top of the step count
+        self.collect_metrics = collect_metrics
+        self.metrics_sample_interval = metrics_sample_interval
+        self._traci = None
+
+    # Starts SUMO the first time and reloads the already running instance afterwards
+    def _load(self, args: List[str]):
+        if self._traci is None:
+            # libsumo is only needed when SUMO actually runs, so import it lazily
+            import libsumo
+            self._traci = libsumo
+            self._traci.start(self.sumo_cmd + args)
+        else:
+            # load() takes the command line without the binary
+            self._traci.load(self.sumo_cmd[1:] + args)
+
+    def evaluate(self, index: 'int', indiv: 'TLLogicSet', step_budget: 'int' = None, scenario: 'Scenario' = None) -> SimulationResult:
+        start = perf_counter()
+        self._load(["-n", self.network_file_pattern.format(index=index)] + self._scenario_args(scenario))
+        loaded = perf_counter()
+        result = self._run(step_budget=step_budget)
+        return result._replace(timings={'sumo_load': loaded - start, 'sumo_steps': perf_counter() - loaded})
+
+    def _scenario_args(self, scenario: 'Scenario') -> List[str]:
+        scenario = scenario or self.default_scenario
+        return scenario.sumo_args() if scenario is not None else []
+
+    # Steps the loaded simulation until every vehicle left the network or the step budget ran out
+    def _run(self, step_budget: 'int' = None) -> SimulationResult:
+        if self.collect_metrics:
+            return self._run_with_metrics(step_budget=step_budget)
+        steps = 0
+        while self._traci.simulation.getMinExpectedNumber() > 0:
+            if step_budget is not None and steps >= step_budget:
+                return censored_result(step_budget=step_budget, remaining_vehicles=self._traci.simulation.getMinExpectedNumber())
+            self._traci.simulationStep()
+            steps += 1
+        # Fitness is based on how long the simulation took
+        return SimulationResult(fitness=steps)
+
+    # Same as _run, feeding every step to a metrics collector; kept apart so plain runs pay nothing for it
+    def _run_with_metrics(self, step_budget: 'int' = None) -> SimulationResult:
+        collector = MetricsCollector(self._traci, sample_interval=self.metrics_sample_interval)
+        collector.subscribe()
+        steps = 0
+        while self._traci.simulation.getMinExpectedNumber() > 0:
+            if step_budget is not None and steps >= step_budget:
+                result = censored_result(step_budget=step_budget, remaining_vehicles=self._traci.simulation.getMinExpectedNumber())
+                return result._replace(metrics=collector.metrics())
+            self._traci.simulationStep()
+            collector.step()
+            steps += 1
+        return SimulationResult(fitness=steps, metrics=collector.metrics())
+
+    def cache_context(self) -> str:
+        # Results without metrics can't answer for a run that wants them
+        return ' '.join(self.sumo_cmd) + (' +metrics' if self.collect_metrics else '')
+
+    def close(self):
+        if self._traci is not None:
+            self._traci.close()
+            self._traci = None
+
+    # Never ship a running simulator to another process
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_traci'] = None
+        return state
+
+# Runs the individuals in SUMO on the template network, pushing each genome's programs in through TraCI
+# so no network file has to be written (or parsed by SUMO) per individual
+class SumoProgramBackend(SumoBackend):
+    needs_network_files = False
+
+    def __init__(self, sumo_cmd: List[str], template_network_file: 'str', default_scenario: 'Scenario' = None, collect_metrics: 'bool' = False, metrics_sample_interval: 'int' = 1):
+        super().__init__(sumo_cmd=sumo_cmd, network_file_pattern=template_network_file, default_scenario=default_scenario, collect_metrics=collect_metrics, metrics_sample_interval=metrics_sample_interval)
+        self.template_network_file = template_network_file
+
+    def evaluate(self, index: 'int', indiv: 'TLLogicSet', step_budget: 'int' = None, scenario: 'Scenario' = None) -> SimulationResult:
+        start = perf_counter()
+        # Reset the simulation to the start, the worker's SUMO instance stays up
+        self._load(["-n", self.template_network_file] + self._scenario_args(scenario))
+        self._set_programs(indiv)
+        loaded = perf_counter()
+        result = self._run(step_budget=step_budget)
+        return result._replace(timings={'sumo_load': loaded - start, 'sumo_steps': perf_counter() - loaded})
+
+    # Replaces the programs of the template with the individual's TLLogics
+    def _set_programs(self, indiv: 'TLLogicSet'):
+        trafficlight = self._traci.trafficlight
+        for tllogic in indiv.tllogics:
+            phases = [trafficlight.Phase(float(phase.duration), phase.state) for phase in tllogic.phases]
+            # TraCI has no way to set the offset, the template's offset stays in effect
+            logic = trafficlight.Logic(tllogic.programID, 0, 0, phases)
+            trafficlight.setProgramLogic(tllogic.id, logic)
+            trafficlight.setProgram(tllogic.id, tllogic.programID)
+
+# Stand-in for SUMO: a cheap deterministic fitness computed from the genome itself
+class StandInBackend(SimulatorBackend):
+    # Cycle length (in seconds) the stand-in considers ideal for every light
+    TARGET_CYCLE = 90
+    # Baseline number of steps for a perfect plan
+    BASE_STEPS = 1000
+
+    def __init__(self, delay: 'float' = 0.0):
+        # Optional wall time per evaluation, useful to emulate the cost of a real simulation
+        self.delay = delay
+
+    def evaluate(self, index: 'int', indiv: 'TLLogicSet', step_budget: 'int' = None, scenario: 'Scenario' = None) -> SimulationResult:
+        if self.delay > 0:
+            sleep(self.delay)
+        demand_scale = scenario.demand_scale if scenario is not None else 1.0
+        steps = self.BASE_STEPS
+        # Every scenario prefers a somewhat different cycle
+        target_cycle = self.TARGET_CYCLE
+        if scenario is not None:
+            target_cycle += hashlib.blake2b(f"{scenario.route_file}:{scenario.seed}".encode(), digest_size=1).digest()[0] % 41 - 20
+        for tllogic in indiv.tllogics:
+            durations = [int(float(phase.duration)) for phase in tllogic.phases]
+            cycle = sum(durations)
+            # Penalize cycles that are far away from the target cycle
+            steps += abs(cycle - target_cycle)
+            # Penalize the share of the cycle where links are stuck on red
+            for phase, duration in zip(tllogic.phases, durations):
+                red_share = sum(1 for light in phase.state if light in 'rO') / max(len(phase.state), 1)
+                steps += int(red_share * duration)
+        # Thinned demand clears the network sooner
+        steps = int(steps * demand_scale)
+        # A small genome dependent jitter so distinct plans rarely tie, thinned demand is noisier
+        genome = ''.join(str(tllogic) for tllogic in indiv.tllogics)
+        if demand_scale != 1.0:
+            genome = f"{demand_scale}:{genome}"
+        digest = hashlib.blake2b(genome.encode(), digest_size=2).digest()
+        steps += digest[0] % max(4, int(4 / demand_scale))
+        if step_budget is not None and steps > step_budget:
+            return censored_result(step_budget=step_budget, remaining_vehicles=1)
+        return SimulationResult(fitness=steps)
@@ -0,0 +1,92 @@
+import numpy as np
+import random
+from population_array import PAD_STATE_CODE, STATE_ALPHABET, PopulationArray, PopulationLayout
+from tllogic_indiv import GREEN_NO_PRI_LIGHT, GREEN_TURN_ARROW_LIGHT, GREEN_YES_PRI_LIGHT, RED_LIGHT, RED_PLUS_YELLOW_LIGHT, YELLOW_LIGHT
+from tllogic_set import TLLogicSet
+from typing import List
+
+# Lights grouped into what they mean for the traffic, a feature is the share of each group per phase
+LIGHT_GROUPS = [
+    [GREEN_YES_PRI_LIGHT, GREEN_NO_PRI_LIGHT, GREEN_TURN_ARROW_LIGHT],
+    [YELLOW_LIGHT, RED_PLUS_YELLOW_LIGHT],
+    [RED_LIGHT],
+]
+# Maps every state code (and the padding) to its light group, lights in no group (off) map past the last group
+_CODE_GROUPS = np.full(PAD_STATE_CODE + 1, len(LIGHT_GROUPS), dtype=np.int64)
+for _group, _lights in enumerate(LIGHT_GROUPS):
+    for _light in _lights:
+        _CODE_GROUPS[STATE_ALPHABET.index(_light)] = _group
+
+# Feature matrix of a population: per phase its duration and the share of green, yellow and red lights,
+# the green time of each phase, and the cycle length of each TLLogic
+def genome_features(population: List['TLLogicSet'], layout: 'PopulationLayout') -> np.ndarray:
+    arrays = PopulationArray.from_tllogic_sets(population, layout=layout)
+    groups = _CODE_GROUPS[arrays.states]
+    shares = np.stack([(groups == group).sum(axis=2) for group in range(len(LIGHT_GROUPS))], axis=2) / layout.state_lengths[None, :, None]
+    green_time = arrays.durations * shares[:, :, 0]
+    cycles = np.add.reduceat(arrays.durations, layout.phase_starts, axis=1)
+    return np.hstack([arrays.durations, shares.reshape(len(population), -1), green_time, cycles])
+
+# Ridge regression on standardized features, cheap enough to refit every generation
+class RidgeSurrogate:
+    def __init__(self, alpha: 'float' = 1.0):
+        self.alpha = alpha
+        self._mean = None
+        self._scale = None
+        self._weights = None
+        self._intercept = 0.0
+
+    @property
+    def is_fitted(self) -> bool:
+        return self._weights is not None
+
+    def fit(self, features: 'np.ndarray', fitnesses: 'np.ndarray'):
+        self._mean = features.mean(axis=0)
+        # Constant features would divide by zero, leave them unscaled (they end up all zeros)
+        self._scale = np.where(features.std(axis=0) > 0, features.std(axis=0), 1.0)
+        standardized = (features - self._mean) / self._scale
+        self._intercept = fitnesses.mean()
+        gram = standardized.T @ standardized + self.alpha * np.eye(standardized.shape[1])
+        self._weights = np.linalg.solve(gram, standardized.T @ (fitnesses - self._intercept))
+
+    def predict(self, features: 'np.ndarray') -> np.ndarray:
+        return ((features - self._mean) / self._scale) @ self._weights + self._intercept
+
+# Learns genome -> fitness from every evaluated individual and picks which candidates are worth a simulation
+class SurrogateScreen:
+    def __init__(self, layout: 'PopulationLayout', history_size: 'int' = 5000, min_history: 'int' = 100, alpha: 'float' = 1.0):
+        self.layout = layout
+        # Only the most recent evaluations are kept, the landscape the population sits in moves
+        self.history_size = history_size
+        # Evaluations needed before the surrogate is trusted at all
+        self.min_history = min_history
+        self.model = RidgeSurrogate(alpha=alpha)
+        self._features = np.empty((0, 0))
+        self._fitnesses = np.empty(0)
+
+    # Adds evaluated individuals to the training history
+    def add(self, population: List['TLLogicSet']):
+        features = genome_features(population, self.layout)
+        fitnesses = np.array([indiv.fitness for indiv in population], dtype=np.float64)
+        if len(self._fitnesses) == 0:
+            self._features, self._fitnesses = features, fitnesses
+        else:
+            self._features = np.vstack([self._features, features])[-self.history_size:]
+            self._fitnesses = np.concatenate([self._fitnesses, fitnesses])[-self.history_size:]
+
+    # Refits the model on the history, once there is enough of it
+    def train(self):
+        if len(self._fitnesses) >= self.min_history:
+            self.model.fit(self._features, self._fitnesses)
+
+    # Picks count candidates to simulate: the best predicted ones, plus a share picked at random so
+    # the surrogate keeps seeing (and learning from) plans it doesn't rate
+    def select(self, candidates: List['TLLogicSet'], count: 'int', exploration_fraction: 'float') -> List['TLLogicSet']:
+        if not self.model.is_fitted or len(candidates) <= count:
+            return candidates[:count]
+        predictions = self.model.predict(genome_features(candidates, self.layout))
+        num_explore = int(round(count * exploration_fraction))
+        ranked = np.argsort(predictions, kind='stable')
+        chosen = list(ranked[:count - num_explore])
+        chosen.extend(random.sample(list(ranked[count - num_explore:]), num_explore))
+        return [candidates[index] for index in chosen]
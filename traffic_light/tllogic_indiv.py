@@ -38,6 +38,10 @@ PHASES_MUTATE_OPTIONS = [PHASES_CLONE_PHASE, PHASES_DELETE_PHASE]
 MIN_LIGHT_DURATION = 1
 MAX_LIGHT_DURATION = 120
 
+# Genomes share Phase and TLLogic objects between individuals (copy-on-write), so once a Phase or TLLogic
+# is part of a TLLogicSet it must not be changed in place: use mutated() and friends, which return new
+# objects and leave the originals alone. The in place methods are for objects nobody else holds on to.
+
 # Represents a Phase component of a Traffic Light Logic
 class Phase:
     def __init__(self, attrib: dict):
@@ -57,6 +61,18 @@ class Phase:
         else:
             # Randomly select a valid duration
             self.duration = random.randint(MIN_LIGHT_DURATION, MAX_LIGHT_DURATION)
+
+    # Returns a mutated copy of the phase, leaving this one untouched
+    def mutated(self) -> 'Phase':
+        phase = self.copy()
+        phase.mutate()
+        return phase
+
+    # Shallow copy, the attributes are immutable strings and ints
+    def copy(self) -> 'Phase':
+        phase_copy = self.__class__.__new__(self.__class__)
+        phase_copy.__dict__.update(self.__dict__)
+        return phase_copy
     
     # Recombines 2 individuals into 2 children
     def recombine(self, partner: 'Phase') -> Tuple['Phase', 'Phase']:
@@ -151,6 +167,37 @@ class TLLogic:
         if random.random() <= mutation_rate:
             # Select a random phase to mutate
             random.choice(self.phases).mutate()
+
+    # Copy-on-write version of mutate: returns self when nothing is mutated, otherwise a new TLLogic that
+    # shares every phase but the mutated one
+    def mutated(self, mutation_rate: 'float') -> 'TLLogic':
+        # Check and see if this individual is going to be mutated
+        if random.random() > mutation_rate:
+            return self
+        # Select a random phase to mutate, drawing exactly like mutate() does
+        index_to_mutate = random.randrange(len(self.phases))
+        tllogic = self.copy()
+        tllogic.phases[index_to_mutate] = self.phases[index_to_mutate].mutated()
+        return tllogic
+
+    # Compact plain-tuple form of the TLLogic, for checkpoints and for shipping genomes to other machines
+    def to_payload(self) -> tuple:
+        return (self.id, self.type, self.programID, self.offset, tuple((phase.duration, phase.state) for phase in self.phases))
+
+    # Rebuilds a TLLogic from its payload
+    @classmethod
+    def from_payload(cls, payload: tuple) -> 'TLLogic':
+        id, type, programID, offset, phases = payload
+        tllogic = cls({'id': id, 'type': type, 'programID': programID, 'offset': offset})
+        tllogic.phases = [Phase({DURATION_ATTR: duration, STATE_ATTR: state}) for duration, state in phases]
+        return tllogic
+
+    # Copy of the TLLogic with its own phase list; the phases themselves are shared
+    def copy(self) -> 'TLLogic':
+        tllogic_copy = self.__class__.__new__(self.__class__)
+        tllogic_copy.__dict__.update(self.__dict__)
+        tllogic_copy.phases = list(self.phases)
+        return tllogic_copy
     
     # Recombines a pair of individuals
     def recombine(self, partner: 'TLLogic') -> Tuple['TLLogic', 'TLLogic']:
@@ -1,5 +1,6 @@
 import random
 from copy import deepcopy
+from junction_index import JunctionIndex
 from tllogic_indiv import TLLogic
 from typing import List, Tuple
 
@@ -7,10 +8,30 @@ class TLLogicSet:
     def __init__(self, tllogics: List['TLLogic'] = None):
         self.tllogics = tllogics
         self.fitness = 0
+        # TrafficMetrics of the last evaluation, when the simulator collects them
+        self.metrics = None
+        # Fitness on each scenario the set has been scored on, by scenario name
+        self.case_fitnesses = {}
 
+    # Mutates the set; only the mutated TLLogics are copied, the others stay shared with other individuals
     def mutate(self, phase_mutation_rate: 'float'):
-        for tllogic in self.tllogics:
-            tllogic.mutate(mutation_rate=phase_mutation_rate)
+        self.tllogics = [tllogic.mutated(mutation_rate=phase_mutation_rate) for tllogic in self.tllogics]
+
+    # Cheap copy of the set: a new list of the same (shared, never changed in place) TLLogics
+    def clone(self) -> 'TLLogicSet':
+        tllogic_set_copy = self.__class__.__new__(self.__class__)
+        tllogic_set_copy.__dict__.update(self.__dict__)
+        tllogic_set_copy.tllogics = list(self.tllogics)
+        return tllogic_set_copy
+
+    # Compact plain-tuple form of the genome (no fitness), see TLLogic.to_payload
+    def to_payload(self) -> tuple:
+        return tuple(tllogic.to_payload() for tllogic in self.tllogics)
+
+    # Rebuilds an (unevaluated) TLLogicSet from its payload
+    @classmethod
+    def from_payload(cls, payload: tuple) -> 'TLLogicSet':
+        return cls(tllogics=[TLLogic.from_payload(tllogic_payload) for tllogic_payload in payload])
                 
     # def recombine(self, partner: 'TLLogicSet') -> Tuple['TLLogicSet', 'TLLogicSet']:
     #     if len(self.tllogics) != len(partner.tllogics):
@@ -20,35 +41,23 @@ class TLLogicSet:
     #         self.tllogics[i].recombine(partner=partner.tllogics[i])
     #     return (self, partner)
 
-    def recombine(self, partner: 'TLLogicSet') -> Tuple['TLLogicSet', 'TLLogicSet']:
-        # Create copies to manipulate
-        self_copy = deepcopy(self)
-        partner_copy = deepcopy(partner)
-        # Create dictionaries to store the TLLogics for each TLLogicSet
-        self_tllogics_dict = {tllogic.id: tllogic for tllogic in self_copy.tllogics}
-        partner_tllogics_dict = {tllogic.id: tllogic for tllogic in partner_copy.tllogics}
-
-        # Find the common junctions between self and partner
-        common_junctions = list(set(tllogic.id[0] for tllogic in self_copy.tllogics) & set(tllogic.id[0] for tllogic in partner_copy.tllogics))
-
-        # Randomly select junctions to swap
-        num_swaps = random.randint(1, len(common_junctions))
-        junctions_to_swap = random.sample(common_junctions, num_swaps)
-
-        # Swap the TLLogics for the selected junctions
-        for junction in junctions_to_swap:
-            self_junction_tllogics = [tllogic.id for tllogic in self_copy.tllogics if tllogic.id.startswith(junction)]
-            partner_junction_tllogics = [tllogic.id for tllogic in partner_copy.tllogics if tllogic.id.startswith(junction)]
-
-            for self_tllogic_id, partner_tllogic_id in zip(self_junction_tllogics, partner_junction_tllogics):
-                self_tllogics_dict[self_tllogic_id], partner_tllogics_dict[partner_tllogic_id] = (
-                    partner_tllogics_dict[partner_tllogic_id], self_tllogics_dict[self_tllogic_id]
-                )
-
-        # Update the TLLogics in each TLLogicSet
-        self_copy.tllogics = list(self_tllogics_dict.values())
-        partner_copy.tllogics = list(partner_tllogics_dict.values())
-
+    # Swaps a random non empty subset of the junction blocks (see JunctionIndex) between copies of the two sets
+    # Only the references of the swapped TLLogics move, the untouched ones stay shared with the parents, so with the
+    # population's index a recombination costs O(swapped). Without one an index of the set's own TLLogics is built
+    # Both sets must list their TLLogics in the index's order, as every individual bred from the template does
+    def recombine(self, partner: 'TLLogicSet', junction_index: 'JunctionIndex' = None) -> Tuple['TLLogicSet', 'TLLogicSet']:
+        if junction_index is None:
+            junction_index = JunctionIndex([tllogic.id for tllogic in self.tllogics])
+        # Create copies to manipulate, TLLogics are only swapped between the children and never changed so they can be shared
+        self_copy = self.clone()
+        partner_copy = partner.clone()
+        if junction_index.num_blocks == 0:
+            return self_copy, partner_copy
+        # Randomly select junctions to swap, sampling from a range costs O(swaps)
+        num_swaps = random.randint(1, junction_index.num_blocks)
+        for block in random.sample(range(junction_index.num_blocks), num_swaps):
+            for position in junction_index.blocks[block]:
+                self_copy.tllogics[position], partner_copy.tllogics[position] = partner_copy.tllogics[position], self_copy.tllogics[position]
         return self_copy, partner_copy
     
     # Allows for easily creating deep copies of a TLLogicSet object
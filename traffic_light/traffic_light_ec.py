@@ -1,27 +1,78 @@
+import argparse
 import datetime
-import libsumo as traci
+import math
+import os
+import queue
 import random
-import re
-import traci.constants as tc
+import signal
+import sys
+import traceback
 
-from copy import deepcopy
+# Shared helpers (telemetry.py) live in the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from checkpoint import checkpoint_cache_path, has_checkpoint, load_checkpoint, save_checkpoint
+from evaluation_pool import EvaluationPool, EvaluationTask
+from fitness_cache import FitnessCache, genome_key, scenario_key
+from island_model import Migration, create_inboxes, migration_targets
+from junction_index import JunctionIndex
 from math import log
-from multiprocessing import Manager, Process
-from parse_traffic_light_logic_xml import parse_tl_logic, write_tl_logic
+from multiprocessing import Process, Queue
+from parse_traffic_light_logic_xml import NetworkTemplate, parse_tl_logic_file
+from plan_validator import PlanValidator
+from population_array import PopulationLayout
+from remote_evaluation import DEFAULT_AUTHKEY, AUTHKEY_ENVIRONMENT_VARIABLE, RemoteEvaluationPool, authkey_from_argument, parse_address
+from simulator_backend import Scenario, SimulationResult, SimulatorBackend, StandInBackend, SumoBackend, SumoProgramBackend
 from statistics import mean, stdev
+from surrogate import SurrogateScreen
+from telemetry import Telemetry
 from time import time
 from tllogic_indiv import TLLogic
 from tllogic_set import TLLogicSet
-from typing import List
-from xml.dom.minidom import parseString
+from typing import Dict, List, NamedTuple, Tuple
 
-# Number of concurrent simulations to run
+# One rung of the multi-fidelity ladder
+class FidelityLevel(NamedTuple):
+    # Share of the scenario's vehicles that are simulated
+    demand_scale: float = 1.0
+    # Steps a run may take before it is stopped and ranked by the vehicles left, None runs until the network is empty
+    horizon: int = None
+
+    # The scenario as simulated at this level
+    def scenario(self, scenario: 'Scenario') -> 'Scenario':
+        return scenario._replace(demand_scale=scenario.demand_scale * self.demand_scale)
+
+# Number of concurrent simulations to run, one worker process (and SUMO instance) each
 NUM_SIMS = 24
 
 # Sumo commands
 SUMO_BINARY = "/usr/bin/sumo"
 SUMO_ROUTE = "traffic_light/route_configs/grid_network_0_routes_stairstep.rou.xml"
-SUMO_CMD = [SUMO_BINARY, "-r", SUMO_ROUTE, "--no-warnings", "true"]
+SUMO_RANDOM_ROUTE = "traffic_light/route_configs/grid_network_0_routes_random.rou.xml"
+SUMO_CMD = [SUMO_BINARY, "--no-warnings", "true"]
+# Scenario plans are scored on when only one is used
+DEFAULT_SCENARIO = Scenario("stairstep", SUMO_ROUTE)
+# Scenarios of the multi-scenario mode, plans should do well on all of them
+SCENARIOS = [
+    DEFAULT_SCENARIO,
+    Scenario("random", SUMO_RANDOM_ROUTE, seed=0),
+    Scenario("random_seed_1", SUMO_RANDOM_ROUTE, seed=1),
+    Scenario("random_seed_2", SUMO_RANDOM_ROUTE, seed=2),
+]
+# Score plans on a rotating subset of SCENARIOS every generation (the elites on all of them) instead of on DEFAULT_SCENARIO only
+MULTI_SCENARIO = False
+# Number of scenarios every individual is scored on per generation in the multi-scenario mode
+SCENARIOS_PER_GENERATION = 2
+# Network the population is evolved from; every individual's network is this one with its own tlLogics spliced in
+TEMPLATE_NETWORK_FILE = "traffic_light/network_configs/grid_network_best_indiv_saved_1.net.xml"
+# Directory the individuals' networks are written to, a tmpfs directory (e.g. /dev/shm/...) keeps them off disk
+NETWORK_DIR = "traffic_light/network_configs"
+# Network file every individual is written to and simulated from
+NETWORK_FILE_NAME = "grid_network_{index}_modified.net.xml"
+# Load the template network once per worker and push every individual's programs in through TraCI instead of
+# writing and loading a network file per individual
+INJECT_PROGRAMS = False
+# Collect waiting time, halting, time loss and throughput (TrafficMetrics) during every simulation
+COLLECT_METRICS = False
 
 # Evolutionary algorithm parameters
 population_size = 100
@@ -29,16 +80,73 @@ tournament_size = 20
 mutation_rate = 0.25
 recombination_rate = 0.7
 num_generations = 50
+# How parents are picked: "tournament", or "lexicase" on the scenarios of the generation
+parent_selection = "tournament"
 
-def read_in_tllogic_set_from_file(filename: str) -> TLLogicSet:
-# Read in the original network file with decent traffic light phases
-    with open(filename, 'r') as file:
-        xml_string_og = file.read()
-        file.close()
+# Maximum number of genome fitnesses remembered across generations
+FITNESS_CACHE_SIZE = 100000
+
+# Breed more children than there are slots and only simulate the ones a surrogate model (trained on every
+# evaluation so far) rates best, plus an exploration share picked at random
+SURROGATE_SCREENING = False
+# Children bred per slot in the population
+SURROGATE_OVERSAMPLING = 4
+# Share of the slots filled with random candidates rather than the surrogate's favourites
+SURROGATE_EXPLORATION = 0.2
+
+# Check bred plans against the conflicts of the network before they are simulated (see plan_validator.py): "repair"
+# fixes every child, "reject" scores broken ones INVALID_PLAN_FITNESS without simulating them, None skips the check
+# Either way the template is repaired, so the initial population starts out valid
+PLAN_VALIDATION = None
+# Fitness of a rejected plan, worse than any plan that ever clears the network
+INVALID_PLAN_FITNESS = 100000
+
+# Multi-fidelity evaluation: successive halving over FIDELITY_LEVELS, every level scores the candidates promoted by
+# the previous one and promotes its best PROMOTION_FRACTION, only the last level runs at full fidelity
+MULTI_FIDELITY = False
+# Fidelity levels from cheapest to full: the share of the vehicles inserted and the steps a run may take (None: no limit)
+FIDELITY_LEVELS = [
+    FidelityLevel(demand_scale=0.25),
+    FidelityLevel(demand_scale=0.5),
+    FidelityLevel(demand_scale=1.0),
+]
+PROMOTION_FRACTION = 0.5
+
+# Steady-state mode: instead of breeding generation after generation, breed a child by tournament whenever a
+# simulation finishes and let it replace the worst member it beats, so no worker waits for the slowest run
+STEADY_STATE = False
+# Evaluated children between population stats reports in the steady-state mode
+STEADY_STATE_REPORT_INTERVAL = 100
 
+# Island model: NUM_ISLANDS populations of population_size // NUM_ISLANDS evolve side by side, each in its own process
+# with its own share of the workers, and every MIGRATION_INTERVAL generations send copies of their NUM_MIGRANTS best
+# to the islands MIGRATION_TOPOLOGY ("ring" or "all", see island_model.py) connects them to, without ever waiting on them
+ISLANDS = False
+NUM_ISLANDS = 4
+MIGRATION_INTERVAL = 5
+MIGRATION_TOPOLOGY = "ring"
+NUM_MIGRANTS = 2
+# How often the main process checks on islands that haven't reported back (seconds)
+ISLAND_POLL_INTERVAL = 1.0
+
+# Where checkpoints are written, and every how many generations
+CHECKPOINT_DIR = "traffic_light/checkpoints"
+CHECKPOINT_INTERVAL = 1
+
+# Phase timings and counters, one JSON line per generation (steady-state: per report interval) when TELEMETRY_FILE is set
+telemetry = Telemetry.from_environment(program="traffic_light")
+
+# Abort simulations that can no longer beat the current elites
+EVALUATION_CUTOFF = True
+# Step budget of a generation as a multiple of the worst elite's fitness of the previous generation
+CUTOFF_SLACK = 1.5
+
+def read_in_tllogic_set_from_file(filename: str) -> TLLogicSet:
+    # Read in the original network file with decent traffic light phases, streaming past everything but the tlLogics
+    tllogics = parse_tl_logic_file(filename)
     # Create an original logic set from which futher sets will be born
-    if xml_string_og:
-        return TLLogicSet(tllogics=parse_tl_logic(xml_string_og))
+    if tllogics:
+        return TLLogicSet(tllogics=tllogics)
 
 # Randomizes the phases of a given TLLogic object
 def apply_entropy_to_tllogic(tllogic: 'TLLogic'):
@@ -46,208 +154,628 @@ def apply_entropy_to_tllogic(tllogic: 'TLLogic'):
         # phase.apply_entropy()
     return tllogic
 
-# Create traffic light logic set from the original
-def get_deepcopy_of_tllogic_set(template_tllogic_set: 'TLLogicSet'):
-    return deepcopy(template_tllogic_set)
-
-def beautify_xml(xml_str: str) -> str:
-    # Parse the XML string
-    dom = parseString(xml_str)
-    # Beautify the XML with toprettyxml
-    pretty_xml = dom.toprettyxml()
-    # Use a regular expression to remove blank lines
-    pretty_xml_without_blanks = re.sub(r'^\s*\n', '', pretty_xml, flags=re.MULTILINE)
+# Create traffic light logic set from the original, sharing its (never changed in place) TLLogics
+def get_copy_of_tllogic_set(template_tllogic_set: 'TLLogicSet'):
+    return template_tllogic_set.clone()
 
-    return pretty_xml_without_blanks
+# Pattern of the network file of the individual at {index}
+def network_file_pattern(network_dir: 'str' = NETWORK_DIR) -> str:
+    return os.path.join(network_dir, NETWORK_FILE_NAME)
 
 # Writes the population to the config files
-def write_population_to_files(population: List[TLLogicSet]):
-    # Write the population to the config files
-    for id, indiv in enumerate(population):
-        indiv_file = f"traffic_light/network_configs/grid_network_{id}_modified.net.xml"
-        with open(indiv_file, 'r') as file:
-            indiv_xml_string = file.read()
-            file.close()
-        if indiv_xml_string:
-            updated_xml_string = write_tl_logic(indiv_xml_string, indiv.tllogics)
-            with open(indiv_file, 'w') as file:
-                file.write(beautify_xml(xml_str=updated_xml_string))
-                file.flush()
-                file.close()
+def write_population_to_files(population: List[TLLogicSet], template: 'NetworkTemplate', network_dir: 'str' = NETWORK_DIR):
+    pattern = network_file_pattern(network_dir)
+    with telemetry.timer("write_networks"):
+        for id, indiv in enumerate(population):
+            template.write(pattern.format(index=id), indiv.tllogics)
 
 # Writes the best individual found by evolution to a marked file so it can easily be used or recovered
-def write_best_indiv_to_file(index: int, best_indiv: TLLogicSet):
-    with open(f"traffic_light/network_configs/grid_network_{index}_modified.net.xml", 'r') as file:
-        best_indiv_xml_string = file.read()
-        file.close()
-    if best_indiv_xml_string:
-        updated_xml_string = write_tl_logic(best_indiv_xml_string, best_indiv.tllogics)
-        with open(f"traffic_light/network_configs/grid_network_best_indiv_{datetime.datetime.now()}.net.xml", 'w') as file:
-            file.write(beautify_xml(xml_str=updated_xml_string))
-            file.flush()
-            file.close()
+def write_best_indiv_to_file(best_indiv: TLLogicSet, template: 'NetworkTemplate', network_dir: 'str' = NETWORK_DIR):
+    template.write(os.path.join(network_dir, f"grid_network_best_indiv_{datetime.datetime.now()}.net.xml"), best_indiv.tllogics)
 
 # Method used to initialize the population
-def initialize_population(population_size: 'int', template_tllogics: 'TLLogicSet') -> List[TLLogicSet]:
+def initialize_population(population_size: 'int', template_tllogics: 'TLLogicSet', template: 'NetworkTemplate' = None, network_dir: 'str' = NETWORK_DIR) -> List[TLLogicSet]:
     population = []
     for _ in range(population_size):
-        tllogic_set = get_deepcopy_of_tllogic_set(template_tllogics)
+        tllogic_set = get_copy_of_tllogic_set(template_tllogics)
         population.append(tllogic_set)
 
     # Write the population to the config files
-    write_population_to_files(population=population)
+    if template is not None:
+        write_population_to_files(population=population, template=template, network_dir=network_dir)
     return population
 
 # Method used to initialize the population from existing network files
-def initialize_population_from_exiting(population_size: 'int') -> List[TLLogicSet]:
+def initialize_population_from_exiting(population_size: 'int', network_dir: 'str' = NETWORK_DIR) -> List[TLLogicSet]:
     population = []
-    # Read in the original network file with decent traffic light phases
+    # Read in the individuals' network files, streaming past everything but the tlLogics
     for i in range(population_size):
-        with open(f"traffic_light/network_configs/grid_network_{i}_modified.net.xml", 'r') as file:
-            xml_string = file.read()
-            file.close()
-
-        # Create an original logic set from which futher sets will be born
-        if xml_string:
-            population.append(TLLogicSet(tllogics=parse_tl_logic(xml_string)))
+        tllogics = parse_tl_logic_file(network_file_pattern(network_dir).format(index=i))
+        if tllogics:
+            population.append(TLLogicSet(tllogics=tllogics))
 
     return population
 
 # Only take the top % of individuals
 def max_fitness_selection(population: List[TLLogicSet]) -> List[TLLogicSet]:
     population.sort(key=lambda x: x.fitness)
-    return [deepcopy(indiv) for indiv in population[:population_size // 10]]
+    return [indiv.clone() for indiv in population[:population_size // 10]]
+
+# Best of tournament_size individuals picked at random
+def tournament_winner(population: List['TLLogicSet'], tournament_size: 'int') -> 'TLLogicSet':
+    tournament = random.sample(population, tournament_size)
+    return min(tournament, key=lambda x: x.fitness)
 
 def tournament_selection(population: List['TLLogicSet'], tournament_size: 'int') -> List['TLLogicSet']:
     selected_individuals = []
     for _ in range(len(population)):
-        tournament = random.sample(population, tournament_size)
-        best_individual = min(tournament, key=lambda x: x.fitness)
-        selected_individuals.append(deepcopy(best_individual))
+        best_individual = tournament_winner(population, tournament_size)
+        # Winners are only used as parents and recombination never changes its parents, no copy needed
+        selected_individuals.append(best_individual)
     return selected_individuals
 
-def run_simulation(index: 'int', return_dict: dict):
-    # Start SUMO simulation
-    traci.start(SUMO_CMD + ["-n", f"traffic_light/network_configs/grid_network_{index}_modified.net.xml"], label=f"{index}")
-    # Initialize the fitness for the index
-    return_dict[index] = 0
-    # start_time = time()
-    steps = 0
-    while traci.simulation.getMinExpectedNumber() > 0:
-        traci.simulationStep()
-        steps += 1
-
-    # Calculate fitness based on how long the simulation took
-    # return_dict[index] = traci.simulation.getTime()
-    simulation_time = traci.simulation.getTime()
-    return_dict[index] = steps
-    # Close SUMO simulation
-    # traci.simulation.close()
-    traci.close()
-    return steps
-
-# Facilitate multiprocessing of inidividuals
-def evaluate_population(population: List[TLLogicSet]):
-    manager = Manager()
-    return_dict = manager.dict()
+# Lexicase selection: the scenarios are the cases, each pick filters the population down to the best on
+# each case in a random order, so plans that are great on some demand patterns survive next to generalists
+def lexicase_selection(population: List['TLLogicSet'], cases: List[str]) -> List['TLLogicSet']:
+    selected_individuals = []
+    for _ in range(len(population)):
+        candidates = population
+        for case in random.sample(cases, len(cases)):
+            best_case_fitness = min(indiv.case_fitnesses[case] for indiv in candidates)
+            candidates = [indiv for indiv in candidates if indiv.case_fitnesses[case] == best_case_fitness]
+            if len(candidates) == 1:
+                break
+        selected_individuals.append(random.choice(candidates))
+    return selected_individuals
+
+# Scenarios a generation is scored on: all of them for the initial population (generation 0), then a window
+# rotating through SCENARIOS, so every scenario comes up regularly
+def sample_scenarios(generation: 'int') -> List['Scenario']:
+    if not MULTI_SCENARIO:
+        return [DEFAULT_SCENARIO]
+    if generation == 0:
+        return SCENARIOS
+    count = min(SCENARIOS_PER_GENERATION, len(SCENARIOS))
+    start = (generation - 1) * count
+    return [SCENARIOS[(start + offset) % len(SCENARIOS)] for offset in range(count)]
+
+# Create the simulator backend the evaluators run the individuals with
+def create_backend(stand_in: 'bool' = False, network_dir: 'str' = NETWORK_DIR, inject_programs: 'bool' = INJECT_PROGRAMS, collect_metrics: 'bool' = COLLECT_METRICS) -> SimulatorBackend:
+    if stand_in:
+        return StandInBackend()
+    if inject_programs:
+        return SumoProgramBackend(sumo_cmd=SUMO_CMD, template_network_file=TEMPLATE_NETWORK_FILE, default_scenario=DEFAULT_SCENARIO, collect_metrics=collect_metrics)
+    return SumoBackend(sumo_cmd=SUMO_CMD, network_file_pattern=network_file_pattern(network_dir), default_scenario=DEFAULT_SCENARIO, collect_metrics=collect_metrics)
+
+# Step budgets for the next generation, per scenario: a run that takes CUTOFF_SLACK times longer than the worst elite
+# could not make it in
+def cutoff_step_budgets(population: List[TLLogicSet]) -> Dict[str, int]:
+    elites = sorted(population, key=lambda indiv: indiv.fitness)[:max(1, population_size // 10)]
+    step_budgets = {}
+    for indiv in elites:
+        for case, case_fitness in indiv.case_fitnesses.items():
+            step_budgets[case] = max(step_budgets.get(case, 0), int(CUTOFF_SLACK * case_fitness))
+    return step_budgets
+
+# Whether a cached result answers the question asked with the given step budget
+def is_usable_result(result: 'SimulationResult', step_budget: 'int') -> bool:
+    # A censored run is only good enough if this run would have been stopped at least as early
+    return not result.censored or (step_budget is not None and step_budget <= result.step_budget)
+
+# Validator of the network's plans when PLAN_VALIDATION is on, None otherwise
+def create_plan_validator(network_template: 'NetworkTemplate') -> 'PlanValidator':
+    return PlanValidator.from_template(network_template) if PLAN_VALIDATION is not None else None
+
+# Applies the PLAN_VALIDATION mode to a freshly bred child: repaired, or left for evaluate_population to reject
+def validate_child(child: 'TLLogicSet', validator: 'PlanValidator') -> 'TLLogicSet':
+    if validator is not None and PLAN_VALIDATION == "repair":
+        with telemetry.timer("validation"):
+            return validator.repair(child)
+    return child
+
+# Counts a fresh simulation and adds the time its worker spent in each part of it to the telemetry
+def record_simulation(result: 'SimulationResult'):
+    telemetry.count("simulations")
+    if result.censored:
+        telemetry.count("aborted")
+    for phase, seconds in (result.timings or {}).items():
+        telemetry.add_time(phase, seconds)
+
+# Evaluate the population on the scenarios in parallel on the evaluator's worker pool, skipping results that are
+# already known. An individual's fitness is its mean over the scenarios, its case_fitnesses holds the fitness on each
+# Returns the number of simulations that were aborted at their step budget
+# slots are the individuals' network file indices when they are not their positions in the list
+# With a validator, plans that break its rules are scored INVALID_PLAN_FITNESS and never reach a simulator
+def evaluate_population(population: List[TLLogicSet], evaluator: 'EvaluationPool', fitness_cache: 'FitnessCache' = None, step_budgets: Dict[str, int] = None, scenarios: List['Scenario'] = None, slots: List[int] = None, validator: 'PlanValidator' = None) -> int:
+    scenarios = scenarios or [DEFAULT_SCENARIO]
+    step_budgets = step_budgets or {}
+    # Result of every individual on every scenario
+    case_results = [{} for _ in population]
+    tasks = []
+    # Runs waiting on a simulation with the individuals they score, duplicates are only simulated once
+    pending = {}
     for (index, indiv) in enumerate(population):
-        indiv.fitness = run_simulation(index=index, return_dict=return_dict)
-    # processes = []
-    # for (index, indiv) in enumerate(population):
-    #     process = Process(target=run_simulation, args=(index, return_dict))
-    #     processes.append(process)
-    #     process.start()
-    
-    # for process in processes:
-    #     process.join()
-
-    # for (key, value) in return_dict.items():
-    #     population[key].fitness = value
-
-def evolutionary_algorithm():
-    # Initialize population
-    template = read_in_tllogic_set_from_file(filename=f"traffic_light/network_configs/grid_network_best_indiv_saved_1.net.xml")
-    if not template:
-        print("Unable to read in template file, exiting")
+        if validator is not None and not validator.is_valid(indiv):
+            case_results[index] = {scenario.name: SimulationResult(fitness=INVALID_PLAN_FITNESS) for scenario in scenarios}
+            telemetry.count("rejected_plans")
+            continue
+        genome = genome_key(indiv) if fitness_cache is not None else str(index)
+        for scenario in scenarios:
+            key = scenario_key(genome, scenario)
+            step_budget = step_budgets.get(scenario.name)
+            cached = fitness_cache.get(key) if fitness_cache is not None else None
+            if cached is not None and is_usable_result(cached, step_budget):
+                case_results[index][scenario.name] = cached
+                telemetry.count("cache_hits")
+            elif key in pending:
+                pending[key].append(index)
+            else:
+                pending[key] = [index]
+                tasks.append(EvaluationTask(index=slots[index] if slots is not None else index, indiv=indiv, scenario=scenario, step_budget=step_budget))
+    with telemetry.timer("evaluation"):
+        results = evaluator.evaluate(tasks)
+    for (key, indices), task, result in zip(pending.items(), tasks, results):
+        record_simulation(result)
+        for index in indices:
+            case_results[index][task.scenario.name] = result
+        if fitness_cache is not None:
+            fitness_cache.put(key, result)
+    if fitness_cache is not None:
+        fitness_cache.flush()
+    for indiv, indiv_results in zip(population, case_results):
+        indiv.case_fitnesses = {case: result.fitness for case, result in indiv_results.items()}
+        indiv.fitness = mean(indiv.case_fitnesses.values())
+        # Metrics only describe a single run
+        indiv.metrics = indiv_results[scenarios[0].name].metrics if len(scenarios) == 1 else None
+    return sum(1 for result in results if result.censored)
+
+# Successive halving: every candidate is scored at the cheapest fidelity level, the best PROMOTION_FRACTION of them
+# move up to the next level and so on, only the finalists get full runs. Individuals whose full runs are cached
+# already (e.g. the elites) skip the ladder. Fitnesses of the levels are then normalised to the full fidelity scale,
+# top down: a candidate dropped at a level is scaled by the ratio between the (normalised) fitness of the promoted
+# candidates and their fitness at that level, and never ranks above a promoted candidate, overall or on any case
+# Returns the number of aborted simulations, including runs stopped at a level's horizon
+def evaluate_population_multi_fidelity(population: List[TLLogicSet], evaluator: 'EvaluationPool', fitness_cache: 'FitnessCache' = None, step_budgets: Dict[str, int] = None, scenarios: List['Scenario'] = None, validator: 'PlanValidator' = None) -> int:
+    scenarios = scenarios or [DEFAULT_SCENARIO]
+    step_budgets = step_budgets or {}
+    full_level = FIDELITY_LEVELS[-1]
+
+    # Scores the individuals at the given positions on a level, returns the aborted runs and the individuals'
+    # fitness and case fitnesses by position
+    def evaluate_level(level: 'FidelityLevel', positions: List[int]) -> Tuple[int, Dict[int, tuple]]:
+        level_budgets = {}
+        for scenario in scenarios:
+            budgets = [budget for budget in (step_budgets.get(scenario.name), level.horizon) if budget is not None]
+            level_budgets[scenario.name] = min(budgets) if budgets else None
+        aborted = evaluate_population([population[index] for index in positions], evaluator=evaluator, fitness_cache=fitness_cache,
+                                      step_budgets=level_budgets, scenarios=[level.scenario(scenario) for scenario in scenarios], slots=positions, validator=validator)
+        return aborted, {index: (population[index].fitness, population[index].case_fitnesses) for index in positions}
+
+    def is_known(indiv: 'TLLogicSet') -> bool:
+        genome = genome_key(indiv)
+        for scenario in scenarios:
+            cached = fitness_cache.get(scenario_key(genome, full_level.scenario(scenario)))
+            if cached is None or not is_usable_result(cached, step_budgets.get(scenario.name)):
+                return False
+        return True
+
+    known = [index for index, indiv in enumerate(population) if fitness_cache is not None and is_known(indiv)]
+    candidates = sorted(set(range(len(population))) - set(known))
+    aborted, final_results = evaluate_level(full_level, known) if known else (0, {})
+    # Fitness and case fitnesses of the candidates at every level below full
+    level_results = []
+    for level_index, level in enumerate(FIDELITY_LEVELS):
+        if not candidates:
+            break
+        level_aborted, results = evaluate_level(level, candidates)
+        aborted += level_aborted
+        if level_index == len(FIDELITY_LEVELS) - 1:
+            final_results.update(results)
+            break
+        level_results.append(results)
+        num_promoted = max(1, math.ceil(len(candidates) * PROMOTION_FRACTION))
+        candidates = sorted(candidates, key=lambda index: population[index].fitness)[:num_promoted]
+    # The finalists' results are full fidelity already, work down from there
+    normalised = dict(final_results)
+    for results in reversed(level_results):
+        promoted = [index for index in results if index in normalised]
+        ratio = sum(normalised[index][0] for index in promoted) / max(sum(results[index][0] for index in promoted), 1)
+        floor = max(normalised[index][0] for index in promoted)
+        # Lexicase and the step budgets go by the cases, they are floored the same way
+        case_floors = {}
+        for index in promoted:
+            for case, case_fitness in normalised[index][1].items():
+                case_floors[case] = max(case_floors.get(case, case_fitness), case_fitness)
+        for index, (fitness, case_fitnesses) in results.items():
+            if index not in normalised:
+                normalised[index] = (max(fitness * ratio, floor), {case: max(case_fitness * ratio, case_floors.get(case, 0)) for case, case_fitness in case_fitnesses.items()})
+    for index, (fitness, case_fitnesses) in normalised.items():
+        population[index].fitness = fitness
+        population[index].case_fitnesses = case_fitnesses
+        # Metrics of a dropped candidate describe a thinned run
+        if index not in final_results:
+            population[index].metrics = None
+    return aborted
+
+# Score the elites (by their fitness on the sampled scenarios) on every scenario, they carry over and should
+# not owe their place to a lucky subset. They keep their population positions, those are their network files
+def evaluate_elites_on_all_scenarios(population: List[TLLogicSet], evaluator: 'EvaluationPool', fitness_cache: 'FitnessCache' = None) -> int:
+    positions = sorted(range(len(population)), key=lambda index: population[index].fitness)[:max(1, population_size // 10)]
+    return evaluate_population([population[index] for index in positions], evaluator=evaluator, fitness_cache=fitness_cache, scenarios=SCENARIOS, slots=positions)
+
+def evolutionary_algorithm(backend: 'SimulatorBackend' = None, num_workers: 'int' = NUM_SIMS, cache_path: 'str' = None, network_dir: 'str' = NETWORK_DIR, checkpoint_dir: 'str' = None, resume: 'bool' = False, listen_address: Tuple[str, int] = None, authkey: 'bytes' = DEFAULT_AUTHKEY, steady_state: 'bool' = STEADY_STATE, num_islands: 'int' = NUM_ISLANDS if ISLANDS else 1, migration: 'Migration' = None):
+    if num_islands > 1:
+        return run_islands(num_islands, backend=backend, num_workers=num_workers, network_dir=network_dir, checkpoint_dir=checkpoint_dir, resume=resume, listen_address=listen_address, authkey=authkey, steady_state=steady_state)
+    os.makedirs(network_dir, exist_ok=True)
+    # Evaluate on SUMO unless told otherwise. Remote workers get genomes, not files, so they inject the programs
+    if backend is None:
+        backend = create_backend(network_dir=network_dir, inject_programs=INJECT_PROGRAMS or listen_address is not None)
+    # A checkpointed run keeps its fitness cache with the checkpoint, so resuming never re-simulates a known genome
+    if cache_path is None and checkpoint_dir is not None:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        cache_path = checkpoint_cache_path(checkpoint_dir)
+    fitness_cache = FitnessCache(max_size=FITNESS_CACHE_SIZE, path=cache_path, context=backend.cache_context())
+    # With a listen address the simulations run on remote workers (see remote_evaluation.py), which are expected
+    # to run the same kind of backend as the one given here, it only describes them to the cache. Anywhere but on
+    # loopback they must share a non-default authkey with the dispatcher
+    if listen_address is not None:
+        evaluator = RemoteEvaluationPool(address=listen_address, authkey=authkey)
+        print(f"Waiting for remote workers on {evaluator.address[0]}:{evaluator.address[1]}")
+    else:
+        evaluator = EvaluationPool(backend=backend, num_workers=num_workers)
+    with evaluator:
+        if steady_state:
+            best_individual = run_steady_state(evaluator=evaluator, fitness_cache=fitness_cache, network_dir=network_dir, migration=migration)
+        else:
+            best_individual = run_evolution(evaluator=evaluator, fitness_cache=fitness_cache, network_dir=network_dir, checkpoint_dir=checkpoint_dir, resume=resume, migration=migration)
+    telemetry.close()
+    print(f"Fitness cache: {fitness_cache.hits} hits, {fitness_cache.misses} misses")
+    return best_individual
+
+# Runs one island of the island model (in its own process): an ordinary run on the island's share of the population
+# and workers, in its own directories, that trades migrants with the others. Sends (island, (payload, fitness,
+# case fitnesses) of its best individual, None) back on results, or (island, None, traceback) when the run fails
+def run_island(island: 'int', num_islands: 'int', inboxes: List[Queue], results: 'Queue', backend: 'SimulatorBackend', num_workers: 'int', network_dir: 'str', checkpoint_dir: 'str', resume: 'bool', listen_address: Tuple[str, int], authkey: 'bytes', steady_state: 'bool', seed: 'int'):
+    global population_size, tournament_size, telemetry
+    # A terminated island unwinds, so its evaluation pool shuts its workers down instead of orphaning them
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+    # Same selection pressure on the smaller population
+    tournament_size = max(2, tournament_size * (population_size // num_islands) // population_size)
+    population_size = population_size // num_islands
+    # Islands must not breed the same children
+    random.seed(seed + island)
+    telemetry = Telemetry(path=telemetry.path, program=f"{telemetry.program}/island_{island}", profile_generation=telemetry.profile_generation)
+    migration = Migration(island, inboxes, migration_targets(island, num_islands, MIGRATION_TOPOLOGY), interval=MIGRATION_INTERVAL, num_migrants=NUM_MIGRANTS)
+    # Every island listens for its own remote workers, on the port after the previous island's
+    if listen_address is not None:
+        listen_address = (listen_address[0], listen_address[1] + island)
+    try:
+        best_individual = evolutionary_algorithm(backend=backend, num_workers=num_workers, network_dir=os.path.join(network_dir, f"island_{island}"),
+                                                 checkpoint_dir=os.path.join(checkpoint_dir, f"island_{island}") if checkpoint_dir is not None else None,
+                                                 resume=resume, listen_address=listen_address, authkey=authkey, steady_state=steady_state, num_islands=1, migration=migration)
+        if best_individual is None:
+            raise RuntimeError("the run ended without a population")
+    except Exception:
+        results.put((island, None, traceback.format_exc()))
         return
-    population = initialize_population(population_size, template_tllogics=template)
-    # population = initialize_population_from_exiting(population_size=population_size)
-    # Evaluate fitness of each individual
-    evaluate_population(population)
-    # Print some population stats
-    print("Generation 0")
+    finally:
+        migration.close()
+    print(f"Island {island}: sent {migration.sent} migrants, took in {migration.received}")
+    results.put((island, (best_individual.to_payload(), best_individual.fitness, best_individual.case_fitnesses), None))
+
+# Island model evolution, see ISLANDS. Islands split the workers between them and run in parallel, returns the best
+# individual of all of them. Raises RuntimeError (after stopping the others) when an island fails or dies
+def run_islands(num_islands: 'int', backend: 'SimulatorBackend' = None, num_workers: 'int' = NUM_SIMS, network_dir: 'str' = NETWORK_DIR, checkpoint_dir: 'str' = None, resume: 'bool' = False, listen_address: Tuple[str, int] = None, authkey: 'bytes' = DEFAULT_AUTHKEY, steady_state: 'bool' = STEADY_STATE):
+    inboxes = create_inboxes(num_islands)
+    results = Queue()
+    # Continue the parent's random stream so a seeded run stays reproducible
+    seed = random.getrandbits(32)
+    islands = [Process(target=run_island, args=(island, num_islands, inboxes, results, backend, max(1, num_workers // num_islands), network_dir, checkpoint_dir, resume, listen_address, authkey, steady_state, seed))
+               for island in range(num_islands)]
+    for process in islands:
+        process.start()
+    # Collect before joining, a process only exits once its result has been picked up. An island that dies without
+    # sending anything (killed, out of memory) is noticed by its exit code
+    island_bests = {}
+    failure = None
+    while failure is None and len(island_bests) < num_islands:
+        try:
+            messages = [results.get(timeout=ISLAND_POLL_INTERVAL)]
+        except queue.Empty:
+            # Whatever a process sent before it exited is readable by now
+            exited = [island for island, process in enumerate(islands) if process.exitcode is not None]
+            messages = []
+            while True:
+                try:
+                    messages.append(results.get_nowait())
+                except queue.Empty:
+                    break
+            received = set(island_bests) | {island for island, _, _ in messages}
+            dead = [island for island in exited if island not in received]
+            if dead:
+                failure = f"Island {dead[0]} exited with code {islands[dead[0]].exitcode} without a result"
+        for island, best, error in messages:
+            if error is not None:
+                failure = failure or f"Island {island} failed:\n{error}"
+            else:
+                island_bests[island] = best
+    if failure is not None:
+        for process in islands:
+            if process.exitcode is None:
+                process.terminate()
+    for process in islands:
+        process.join()
+    if failure is not None:
+        raise RuntimeError(failure)
+    best_individual = None
+    for island, (payload, fitness, case_fitnesses) in sorted(island_bests.items()):
+        print(f"Island {island} best fitness: {fitness}")
+        if best_individual is None or fitness < best_individual.fitness:
+            best_individual = TLLogicSet.from_payload(payload)
+            best_individual.fitness = fitness
+            best_individual.case_fitnesses = case_fitnesses
+    return best_individual
+
+# Closes the telemetry record of a generation with the population's stats
+def end_generation_telemetry(generation: 'int', population: List[TLLogicSet], **fields):
+    fitnesses = [indiv.fitness for indiv in population]
+    telemetry.end_generation(generation, best=min(fitnesses), mean=mean(fitnesses), stdev=stdev(fitnesses), **fields)
+
+# Print some population stats
+def print_population_stats(population: List[TLLogicSet]):
     print(f"Best fitness: {min([inidiv.fitness for inidiv in population])}")
     print(f"Average fitness: {mean([inidiv.fitness for inidiv in population])}")
     print(f"Standard Deviation fitness: {stdev([inidiv.fitness for inidiv in population])}")
 
-    for generation in range(num_generations):
+# With a migration (island model) the population trades individuals with the other islands after every generation
+def run_evolution(evaluator: 'EvaluationPool', fitness_cache: 'FitnessCache' = None, network_dir: 'str' = NETWORK_DIR, checkpoint_dir: 'str' = None, resume: 'bool' = False, migration: 'Migration' = None):
+    # Parse the template network once, every individual's network is spliced from it and its tlLogics seed the population
+    network_template = NetworkTemplate.from_file(TEMPLATE_NETWORK_FILE)
+    if not network_template.tl_logics:
+        print("Unable to read in template file, exiting")
+        return
+    # Backends that take the programs straight from the genomes don't need any files written
+    write_networks = evaluator.needs_network_files
+    validator = create_plan_validator(network_template)
+    # Recombination blocks of the network's traffic lights, shared by every individual
+    junction_index = JunctionIndex.from_template(network_template)
+    if resume and checkpoint_dir is not None and has_checkpoint(checkpoint_dir):
+        # Pick up where the interrupted run left off, with the same random stream
+        checkpoint = load_checkpoint(checkpoint_dir)
+        population = checkpoint.population
+        random.setstate(checkpoint.random_state)
+        completed_generations = checkpoint.completed_generations
+        print(f"Resuming from checkpoint after generation {completed_generations}")
+    else:
+        telemetry.start_generation(0)
+        # Initialize population
+        template = TLLogicSet(tllogics=network_template.parse_tl_logics())
+        if validator is not None:
+            template = validator.repair(template)
+        population = initialize_population(population_size, template_tllogics=template, template=network_template if write_networks else None, network_dir=network_dir)
+        # population = initialize_population_from_exiting(population_size=population_size)
+        # Evaluate fitness of each individual (the initial population is a single genome, every scenario costs one run)
+        evaluate_population(population, evaluator=evaluator, fitness_cache=fitness_cache, scenarios=sample_scenarios(0))
+        print("Generation 0")
+        print_population_stats(population)
+        completed_generations = 0
+        if checkpoint_dir is not None:
+            with telemetry.timer("checkpoint"):
+                save_checkpoint(checkpoint_dir, completed_generations=completed_generations, population=population)
+        end_generation_telemetry(0, population)
+
+    # The surrogate learns from every evaluated generation (from this run on, when resuming)
+    surrogate = None
+    if SURROGATE_SCREENING:
+        surrogate = SurrogateScreen(layout=PopulationLayout(TLLogicSet(tllogics=network_template.parse_tl_logics()), junction_index=junction_index), min_history=population_size)
+        surrogate.add(population)
+        surrogate.train()
+
+    for generation in range(completed_generations, num_generations):
         print(f"Generation {generation + 1}")
+        telemetry.start_generation(generation + 1)
+        # Budget runs by the elites of the generation that was just evaluated
+        step_budgets = cutoff_step_budgets(population) if EVALUATION_CUTOFF else None
         # Maximize selective pressure
         # Create new population; ensure survival of top n individuals
-        new_population = max_fitness_selection(population)
-        # Tournament selection
-        selected_individuals = tournament_selection(population, tournament_size)
-        # Fill the population in with some recombined and mutated individuals 
-        while len(new_population) < population_size:
-            parent1, parent2 = random.sample(selected_individuals, 2)
-            child1, child2 = parent1.recombine(parent2)
-            child1.mutate(mutation_rate)
-            child2.mutate(mutation_rate)
-            new_population.extend([child1, child2])
-
-        # Deepcopy for safety
-        population = [deepcopy(indiv) for indiv in new_population[:population_size]]
+        with telemetry.timer("selection"):
+            new_population = max_fitness_selection(population)
+            # Select parents, lexicase uses the scenarios everyone was scored on last generation as its cases
+            if parent_selection == "lexicase":
+                selected_individuals = lexicase_selection(population, cases=[scenario.name for scenario in sample_scenarios(generation)])
+            else:
+                selected_individuals = tournament_selection(population, tournament_size)
+        # Fill the population in with some recombined and mutated individuals, with surrogate screening
+        # breed several candidates per slot and keep the most promising ones
+        num_children = population_size - len(new_population)
+        num_candidates = num_children * SURROGATE_OVERSAMPLING if surrogate is not None else num_children
+        children = []
+        with telemetry.timer("breeding"):
+            while len(children) < num_candidates:
+                parent1, parent2 = random.sample(selected_individuals, 2)
+                child1, child2 = parent1.recombine(parent2, junction_index=junction_index)
+                child1.mutate(mutation_rate)
+                child2.mutate(mutation_rate)
+                children.extend([validate_child(child1, validator), validate_child(child2, validator)])
+        if surrogate is not None:
+            with telemetry.timer("surrogate"):
+                children = surrogate.select(children, count=num_children, exploration_fraction=SURROGATE_EXPLORATION)
+
+        # Children are fresh sets (copy-on-write), no defensive copy needed
+        population = (new_population + children)[:population_size]
         # Write the population to the config files
-        write_population_to_files(population=population)
-        # Evaluate the population
-        evaluate_population(population=population)
-        # Print some population stats
-        print(f"Best fitness: {min([inidiv.fitness for inidiv in population])}")
-        print(f"Average fitness: {mean([inidiv.fitness for inidiv in population])}")
-        print(f"Standard Deviation fitness: {stdev([inidiv.fitness for inidiv in population])}")
+        if write_networks:
+            write_population_to_files(population=population, template=network_template, network_dir=network_dir)
+        # Evaluate the population, giving up on runs that could not make it into the elites anyway
+        evaluate = evaluate_population_multi_fidelity if MULTI_FIDELITY else evaluate_population
+        aborted = evaluate(population=population, evaluator=evaluator, fitness_cache=fitness_cache, step_budgets=step_budgets, scenarios=sample_scenarios(generation + 1),
+                           validator=validator if PLAN_VALIDATION == "reject" else None)
+        if MULTI_SCENARIO:
+            aborted += evaluate_elites_on_all_scenarios(population, evaluator=evaluator, fitness_cache=fitness_cache)
+        print_population_stats(population)
+        if surrogate is not None:
+            # Retrain on what was just simulated
+            with telemetry.timer("surrogate"):
+                surrogate.add(population)
+                surrogate.train()
+        if step_budgets is not None:
+            print(f"Aborted simulations: {aborted} (step budgets {step_budgets})")
+        # Immigrants come with their scores from their own island and are rescored here next generation
+        if migration is not None:
+            with telemetry.timer("migration"):
+                telemetry.count("immigrants", migration.exchange(generation + 1, population))
+        if checkpoint_dir is not None and (generation + 1) % CHECKPOINT_INTERVAL == 0:
+            with telemetry.timer("checkpoint"):
+                save_checkpoint(checkpoint_dir, completed_generations=generation + 1, population=population)
+        end_generation_telemetry(generation + 1, population, step_budgets=step_budgets)
         # # Find the best individual
         # best_individual = min(population, key=lambda x: x.fitness)
         # # Write the best individual to a config files
-        # write_best_indiv_to_file(index=population.index(best_individual), best_indiv=best_individual)
+        # write_best_indiv_to_file(best_indiv=best_individual, template=network_template)
 
     # Find the best individual
     best_individual = min(population, key=lambda x: x.fitness)
+    if best_individual.metrics is not None:
+        print(f"Best individual's traffic metrics: {best_individual.metrics}")
     # Write the best individual to a config files
-    write_best_indiv_to_file(index=population.index(best_individual), best_indiv=best_individual)
+    write_best_indiv_to_file(best_indiv=best_individual, template=network_template, network_dir=network_dir)
         
     return best_individual
 
+# Asynchronous steady-state evolution: every worker always has a child to simulate, whenever one finishes the
+# child is scored, replaces the worst member of the population if it is at least as good, and new children are bred
+# from the population as it is at that moment. Spends the same number of evaluations as num_generations generations
+# Checkpointing is not supported in this mode. On an island, migrants are traded every report interval
+def run_steady_state(evaluator: 'EvaluationPool', fitness_cache: 'FitnessCache' = None, network_dir: 'str' = NETWORK_DIR, migration: 'Migration' = None):
+    network_template = NetworkTemplate.from_file(TEMPLATE_NETWORK_FILE)
+    if not network_template.tl_logics:
+        print("Unable to read in template file, exiting")
+        return
+    write_networks = evaluator.needs_network_files
+    validator = create_plan_validator(network_template)
+    # Recombination blocks of the network's traffic lights, shared by every individual
+    junction_index = JunctionIndex.from_template(network_template)
+    template = TLLogicSet(tllogics=network_template.parse_tl_logics())
+    if validator is not None:
+        template = validator.repair(template)
+    telemetry.start_generation(0)
+    population = initialize_population(population_size, template_tllogics=template, template=network_template if write_networks else None, network_dir=network_dir)
+    scenarios = SCENARIOS if MULTI_SCENARIO else [DEFAULT_SCENARIO]
+    evaluate_population(population, evaluator=evaluator, fitness_cache=fitness_cache, scenarios=scenarios)
+    print("Evaluations 0")
+    print_population_stats(population)
+    end_generation_telemetry(0, population, evaluations=0)
+
+    evaluation_budget = num_generations * population_size
+    # Children being simulated by their slot (which is also their network file index), with their results so far
+    in_flight = {}
+    free_slots = []
+    bred = 0
+    evaluated = 0
+    aborted = 0
+
+    # Scores a child that has all its results and lets it compete for a place in the population
+    def finish_child(child: 'TLLogicSet', case_results: Dict[str, 'SimulationResult']):
+        nonlocal evaluated
+        child.case_fitnesses = {case: result.fitness for case, result in case_results.items()}
+        child.fitness = mean(child.case_fitnesses.values())
+        child.metrics = case_results[scenarios[0].name].metrics if len(scenarios) == 1 else None
+        worst = max(range(len(population)), key=lambda index: population[index].fitness)
+        if child.fitness <= population[worst].fitness:
+            population[worst] = child
+        evaluated += 1
+        if evaluated % STEADY_STATE_REPORT_INTERVAL == 0:
+            print(f"Evaluations {evaluated}")
+            print_population_stats(population)
+            if EVALUATION_CUTOFF:
+                print(f"Aborted simulations: {aborted}")
+            if migration is not None:
+                with telemetry.timer("migration"):
+                    telemetry.count("immigrants", migration.exchange(evaluated // STEADY_STATE_REPORT_INTERVAL, population))
+            # A report interval is the steady-state's generation
+            end_generation_telemetry(evaluated // STEADY_STATE_REPORT_INTERVAL, population, evaluations=evaluated)
+
+    # Breeds a child from the current population and submits the runs the cache can't answer
+    def breed_child():
+        nonlocal bred
+        with telemetry.timer("breeding"):
+            parent1 = tournament_winner(population, tournament_size)
+            parent2 = tournament_winner(population, tournament_size)
+            child = parent1.recombine(parent2, junction_index=junction_index)[0]
+            child.mutate(mutation_rate)
+        child = validate_child(child, validator)
+        bred += 1
+        if validator is not None and PLAN_VALIDATION == "reject" and not validator.is_valid(child):
+            telemetry.count("rejected_plans")
+            finish_child(child, {scenario.name: SimulationResult(fitness=INVALID_PLAN_FITNESS) for scenario in scenarios})
+            return
+        step_budgets = cutoff_step_budgets(population) if EVALUATION_CUTOFF else {}
+        genome = genome_key(child) if fitness_cache is not None else None
+        case_results = {}
+        tasks = []
+        for scenario in scenarios:
+            step_budget = step_budgets.get(scenario.name)
+            cached = fitness_cache.get(scenario_key(genome, scenario)) if fitness_cache is not None else None
+            if cached is not None and is_usable_result(cached, step_budget):
+                case_results[scenario.name] = cached
+                telemetry.count("cache_hits")
+            else:
+                tasks.append((scenario, step_budget))
+        if not tasks:
+            finish_child(child, case_results)
+            return
+        # Slots are reused, so there are never more network files than runs in flight
+        slot = free_slots.pop() if free_slots else len(in_flight)
+        if write_networks:
+            with telemetry.timer("write_networks"):
+                network_template.write(network_file_pattern(network_dir).format(index=slot), child.tllogics)
+        in_flight[slot] = (child, genome, case_results)
+        for scenario, step_budget in tasks:
+            evaluator.submit(EvaluationTask(index=slot, indiv=child, scenario=scenario, step_budget=step_budget))
+
+    while True:
+        # Keep every worker busy until the budget is spent
+        while bred < evaluation_budget and len(in_flight) < max(1, evaluator.num_workers):
+            breed_child()
+        if not in_flight:
+            break
+        # Time spent waiting on the workers
+        with telemetry.timer("evaluation"):
+            task, result = evaluator.next_result()
+        record_simulation(result)
+        child, genome, case_results = in_flight[task.index]
+        case_results[task.scenario.name] = result
+        aborted += result.censored
+        if fitness_cache is not None:
+            fitness_cache.put(scenario_key(genome, task.scenario), result)
+        if len(case_results) == len(scenarios):
+            del in_flight[task.index]
+            free_slots.append(task.index)
+            finish_child(child, case_results)
+    if fitness_cache is not None:
+        fitness_cache.flush()
+
+    best_individual = min(population, key=lambda x: x.fitness)
+    if best_individual.metrics is not None:
+        print(f"Best individual's traffic metrics: {best_individual.metrics}")
+    write_best_indiv_to_file(best_indiv=best_individual, template=network_template, network_dir=network_dir)
+    return best_individual
+
 # Overwrite the main function cause that seems to be the thing to do in python
 if __name__ == "__main__":
-    print(str(evolutionary_algorithm()))
-
-# print(f"Phases: {[phase for sublist in [tllogic.phases for tllogic in test_set.tllogics] for phase in sublist]}")
-
-# traci.set_phases(phases=[phase for sublist in [tllogic.phases for tllogic in test_set.tllogics] for phase in sublist])
-
-# traci.start(SUMO_CMD + ["-n", f"traffic_light/network_configs/grid_network_best_indiv_saved_1.net.xml"])
-# # pick an arbitrary junction
-# # junctionID = traci.junction.getIDList()[0]
-# # # subscribe around that junction with a sufficiently large
-# # # radius to retrieve the speeds of all vehicles in every step
-# # traci.junction.subscribeContext(
-# #     junctionID, tc.CMD_GET_VEHICLE_VARIABLE, 1000000,
-# #     [tc.VAR_SPEED, tc.VAR_ALLOWED_SPEED]
-# # )
-# # Get the step length
-# # stepLength = traci.simulation.getDeltaT()
-# sim_start_time = time()
-# while traci.simulation.getMinExpectedNumber() > 0:
-#     traci.simulationStep()
-#     # scResults = traci.junction.getContextSubscriptionResults(junctionID)
-#     # halting = 0
-#     # if scResults:
-#     #     relSpeeds = [d[tc.VAR_SPEED] / d[tc.VAR_ALLOWED_SPEED] for d in scResults.values()]
-#     #     # compute values corresponding to summary-output
-#     #     running = len(relSpeeds)
-#     #     halting = len([1 for d in scResults.values() if d[tc.VAR_SPEED] < 0.1])
-#     #     meanSpeedRelative = sum(relSpeeds) / running
-#     #     timeLoss = (1 - meanSpeedRelative) * running * stepLength
-# print(traci.simulation.getTime())
-# print(f"Time taken by simulation: {time() - sim_start_time}")
-# traci.close()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Evolve the traffic light programs of the grid network")
+    parser.add_argument("--resume", action="store_true", help="continue from the checkpoint in --checkpoint-dir")
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR, help="directory checkpoints are written to and resumed from")
+    parser.add_argument("--workers", type=int, default=NUM_SIMS, help="number of concurrent simulations")
+    parser.add_argument("--stand-in", action="store_true", help="score plans with the stand-in simulator instead of SUMO")
+    parser.add_argument("--steady-state", action="store_true", help="breed a child whenever a simulation finishes instead of by generation")
+    parser.add_argument("--listen", help="host:port to serve remote workers on instead of simulating locally")
+    parser.add_argument("--authkey", help=f"shared secret of the remote workers (default: ${AUTHKEY_ENVIRONMENT_VARIABLE}), required unless --listen is a loopback address")
+    parser.add_argument("--islands", type=int, default=NUM_ISLANDS if ISLANDS else 1, help="number of island populations evolving in parallel")
+    parser.add_argument("--telemetry", default=telemetry.path, help="JSON Lines file per generation timings and counters are appended to")
+    parser.add_argument("--profile-generation", type=int, default=telemetry.profile_generation, help="generation to run under cProfile")
+    args = parser.parse_args()
+    telemetry = Telemetry(path=args.telemetry, program="traffic_light", profile_generation=args.profile_generation)
+    listen_address = parse_address(args.listen) if args.listen else None
+    backend = create_backend(stand_in=args.stand_in, inject_programs=INJECT_PROGRAMS or listen_address is not None)
+    print(str(evolutionary_algorithm(backend=backend, num_workers=args.workers, checkpoint_dir=args.checkpoint_dir, resume=args.resume, listen_address=listen_address, authkey=authkey_from_argument(args.authkey), steady_state=args.steady_state, num_islands=args.islands)))
@@ -0,0 +1,75 @@
+from typing import NamedTuple, Tuple
+
+# Radius (in meters) of the vehicle context subscription, large enough to cover the whole network
+CONTEXT_RADIUS = 1000000
+# Speed (m/s) under which a vehicle counts as halting, same threshold SUMO uses
+HALTING_SPEED = 0.1
+
+# Traffic metrics of one simulation, accumulated over every sampled step
+class TrafficMetrics(NamedTuple):
+    # Steps until every vehicle left the network
+    steps: int
+    # Vehicle seconds spent halting
+    waiting_time: float
+    # Sum over the sampled steps of the number of halting vehicles
+    halting: int
+    # Vehicle seconds lost to driving slower than allowed
+    time_loss: float
+    # Vehicles that reached their destination
+    throughput: int
+
+    # Metrics as a fitness vector where every objective is minimized
+    def fitness_vector(self) -> Tuple[float, ...]:
+        return (self.steps, self.waiting_time, self.time_loss, -self.throughput)
+
+# Collects TrafficMetrics while a simulation runs, through subscriptions so every step costs
+# a single bulk result fetch instead of a getter call per vehicle
+class MetricsCollector:
+    def __init__(self, traci, sample_interval: 'int' = 1):
+        # traci.constants is shared by traci and libsumo, only import it once SUMO is in use
+        import traci.constants as tc
+        self._tc = tc
+        self.traci = traci
+        # Only every sample_interval-th step is measured, larger intervals trade accuracy for speed
+        self.sample_interval = sample_interval
+        self.step_length = 1.0
+        self.junction_id = None
+        self.steps = 0
+        self.waiting_time = 0.0
+        self.halting = 0
+        self.time_loss = 0.0
+        self.throughput = 0
+
+    # Subscribes to what the collector needs; subscriptions don't survive a load(), so call it after every load
+    def subscribe(self):
+        tc = self._tc
+        self.step_length = self.traci.simulation.getDeltaT()
+        self.traci.simulation.subscribe([tc.VAR_ARRIVED_VEHICLES_NUMBER])
+        # Any junction will do, the radius covers the whole network
+        self.junction_id = self.traci.junction.getIDList()[0]
+        self.traci.junction.subscribeContext(self.junction_id, tc.CMD_GET_VEHICLE_VARIABLE, CONTEXT_RADIUS, [tc.VAR_SPEED, tc.VAR_ALLOWED_SPEED])
+
+    # Accumulates the results of the step that was just simulated
+    def step(self):
+        tc = self._tc
+        self.steps += 1
+        self.throughput += self.traci.simulation.getSubscriptionResults("")[tc.VAR_ARRIVED_VEHICLES_NUMBER]
+        if self.steps % self.sample_interval:
+            return
+        vehicles = self.traci.junction.getContextSubscriptionResults(self.junction_id)
+        if not vehicles:
+            return
+        halting = 0
+        relative_speed = 0.0
+        for values in vehicles.values():
+            speed = values[tc.VAR_SPEED]
+            if speed < HALTING_SPEED:
+                halting += 1
+            relative_speed += speed / values[tc.VAR_ALLOWED_SPEED]
+        sampled_time = self.step_length * self.sample_interval
+        self.halting += halting
+        self.waiting_time += halting * sampled_time
+        self.time_loss += (len(vehicles) - relative_speed) * sampled_time
+
+    def metrics(self) -> TrafficMetrics:
+        return TrafficMetrics(steps=self.steps, waiting_time=self.waiting_time, halting=self.halting, time_loss=self.time_loss, throughput=self.throughput)